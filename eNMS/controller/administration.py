@@ -160,8 +160,7 @@ class AdministrationController(BaseController):
             for service in fetch_all("service"):
                 service.set_name()
             if not skip_update_pools_after_import:
-                for pool in fetch_all("pool"):
-                    pool.compute_pool()
+                self.update_all_pools()
             self.log("info", status)
         except Exception:
             info(chr(10).join(format_exc().splitlines()))
@@ -1,18 +1,30 @@
 from apscheduler.jobstores.base import JobLookupError
+from apscheduler.util import utc_timestamp_to_datetime
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from flask import request
 from flask_login import current_user
+from json import dumps
+from logging import error
 from napalm._SUPPORTED_DRIVERS import SUPPORTED_DRIVERS
 from netmiko.ssh_dispatcher import CLASS_MAPPER, FILE_TRANSFER_MAP
 from operator import itemgetter
+from os import getpid
 from pathlib import Path
 from re import search, sub
+from socket import gethostname
+from sqlalchemy import and_, or_, select
+from threading import BoundedSemaphore, Lock, RLock, Thread
+from time import sleep, time
+from traceback import format_exc
 from uuid import uuid4
 
 from eNMS.controller.base import BaseController
+from eNMS.controller.logs import RunLog
 from eNMS.database import Session
 from eNMS.database.functions import delete, factory, fetch, fetch_all, objectify
+from eNMS.models import models
 
 
 class AutomationController(BaseController):
@@ -20,15 +32,53 @@ class AutomationController(BaseController):
     NETMIKO_DRIVERS = sorted((driver, driver) for driver in CLASS_MAPPER)
     NETMIKO_SCP_DRIVERS = sorted((driver, driver) for driver in FILE_TRANSFER_MAP)
     NAPALM_DRIVERS = sorted((driver, driver) for driver in SUPPORTED_DRIVERS[1:])
-    connections_cache = {"napalm": defaultdict(dict), "netmiko": defaultdict(dict)}
     service_db = defaultdict(lambda: {"runs": 0})
     run_db = defaultdict(dict)
-    run_logs = defaultdict(list)
+    run_logs = defaultdict(RunLog)
+    result_buffer = defaultdict(lambda: {"start": time(), "results": []})
+    result_buffer_lock = Lock()
+    payload_locks = defaultdict(RLock)
+
+    def buffer_result(self, run_id, result):
+        settings = self.settings["automation"]
+        with self.result_buffer_lock:
+            buffer = self.result_buffer[run_id]
+            buffer["results"].append(result)
+            flush = (
+                len(buffer["results"]) >= settings["result_batch_size"]
+                or time() - buffer["start"] >= settings["result_batch_interval"]
+            )
+        if flush:
+            self.flush_results(run_id)
+
+    def flush_results(self, run_id):
+        with self.result_buffer_lock:
+            results = self.result_buffer.pop(run_id, {"results": []})["results"]
+        if results:
+            Session.bulk_insert_mappings(models["result"], results)
+            Session.commit()
+
+    def result_flusher(self):
+        while True:
+            sleep(1)
+            interval = self.settings["automation"]["result_batch_interval"]
+            with self.result_buffer_lock:
+                expired = [
+                    run_id
+                    for run_id, buffer in self.result_buffer.items()
+                    if time() - buffer["start"] >= interval
+                ]
+            try:
+                for run_id in expired:
+                    self.flush_results(run_id)
+            except Exception as exc:
+                Session.rollback()
+                error(f"Failed to write buffered results ({exc})")
+            finally:
+                Session.remove()
 
     def stop_workflow(self, runtime):
-        run = fetch("run", allow_none=True, runtime=runtime)
-        if run and run.run_state["status"] == "Running":
-            run.run_state["status"] = "stop"
+        if self.run_store.stop(runtime):
             return True
 
     def add_edge(self, workflow_id, subtype, source, destination):
@@ -122,11 +172,30 @@ class AutomationController(BaseController):
         workflow = fetch("workflow", id=workflow_id)
         return workflow.duplicate().serialized
 
-    def get_service_logs(self, service, runtime):
+    def get_service_logs(self, service, runtime, start=0):
+        start = int(start)
+        live_logs = self.run_store.read_logs(runtime, start)
+        if live_logs:
+            logs, line = live_logs
+            return {"logs": "\n".join(logs), "line": line, "refresh": True}
         run = fetch("run", allow_none=True, parent_runtime=runtime, service_id=service)
         result = run.result() if run else None
-        logs = result["logs"] if result else self.run_logs.get(runtime, [])
-        return {"logs": "\n".join(logs), "refresh": not bool(result)}
+        logs = result["logs"][start:] if result else []
+        return {
+            "logs": "\n".join(logs),
+            "line": start + len(logs),
+            "refresh": not bool(result),
+        }
+
+    def pop_run_logs(self, runtime):
+        run_log = self.run_logs.pop(runtime, None)
+        return run_log.dump() if run_log else []
+
+    def pop_run_state(self, runtime):
+        state = self.run_db.pop(runtime)
+        self.payload_locks.pop(runtime, None)
+        self.run_store.finish(runtime)
+        return state
 
     def get_runtimes(self, type, id):
         runs = fetch("run", allow_none=True, all_matches=True, service_id=id)
@@ -288,6 +357,96 @@ class AutomationController(BaseController):
         payload = {**initial_payload, **kwargs}
         return run.run(payload)
 
+    @staticmethod
+    def queue_run(service, **kwargs):
+        kwargs.setdefault("runtime", str(datetime.now()))
+        job = models["job"](
+            service_id=service, runtime=kwargs["runtime"], kwargs=kwargs
+        )
+        Session.add(job)
+        Session.commit()
+
+    def submit_run(self, service_id, **kwargs):
+        if self.settings["automation"]["job_queue"]["active"]:
+            return self.queue_run(service_id, **kwargs)
+        self.scheduler.add_job(
+            id=self.get_time(),
+            func=self.run,
+            run_date=datetime.now(),
+            args=[service_id],
+            kwargs=kwargs,
+            trigger="date",
+            jobstore="local",
+        )
+
+    def claim_job(self, runner):
+        job_model, settings = models["job"], self.settings["automation"]["job_queue"]
+        stale = and_(
+            job_model.status == "Running",
+            job_model.heartbeat < time() - settings["claim_timeout"],
+        )
+        claimable = or_(job_model.status == "Queued", stale)
+        queued = (
+            Session.query(job_model.id)
+            .filter(claimable)
+            .order_by(job_model.id)
+            .limit(settings["claim_batch_size"])
+        )
+        for (job_id,) in queued.all():
+            claimed = (
+                Session.query(job_model)
+                .filter(job_model.id == job_id, claimable)
+                .update(
+                    {"status": "Running", "runner": runner, "heartbeat": time()},
+                    synchronize_session=False,
+                )
+            )
+            Session.commit()
+            if claimed:
+                job = fetch("job", id=job_id)
+                return job.id, job.service_id, dict(job.kwargs)
+
+    def run_job(self, job_id, service_id, kwargs):
+        try:
+            self.run(service_id, **kwargs)
+        except Exception:
+            Session.rollback()
+            self.log("error", f"Job {kwargs['runtime']} failed:\n{format_exc()}")
+        finally:
+            Session.query(models["job"]).filter_by(id=job_id).delete()
+            Session.commit()
+            Session.remove()
+
+    def runner_heartbeat(self, runner):
+        interval = self.settings["automation"]["job_queue"]["heartbeat_interval"]
+        while True:
+            sleep(interval)
+            try:
+                Session.query(models["job"]).filter_by(
+                    runner=runner, status="Running"
+                ).update({"heartbeat": time()}, synchronize_session=False)
+                Session.commit()
+            except Exception as exc:
+                Session.rollback()
+                error(f"Runner {runner} failed to update its heartbeat ({exc})")
+            finally:
+                Session.remove()
+
+    def start_runner(self, threads):
+        runner, slots = f"{gethostname()}:{getpid()}", BoundedSemaphore(threads)
+        poll_interval = self.settings["automation"]["job_queue"]["poll_interval"]
+        Thread(target=self.runner_heartbeat, args=(runner,), daemon=True).start()
+        with ThreadPoolExecutor(threads) as executor:
+            while True:
+                slots.acquire()
+                job = self.claim_job(runner)
+                if not job:
+                    slots.release()
+                    sleep(poll_interval)
+                    continue
+                future = executor.submit(self.run_job, *job)
+                future.add_done_callback(lambda _: slots.release())
+
     def run_service(self, path, **kwargs):
         path_ids = str(path).split(">")
         if kwargs.get("restart_from_top_level_workflow", False):
@@ -301,14 +460,7 @@ class AutomationController(BaseController):
         service = fetch("service", id=service_id)
         kwargs["runtime"] = runtime = self.get_time()
         if kwargs.get("asynchronous", True):
-            self.scheduler.add_job(
-                id=self.get_time(),
-                func=self.run,
-                run_date=datetime.now(),
-                args=[service_id],
-                kwargs=kwargs,
-                trigger="date",
-            )
+            self.submit_run(service_id, **kwargs)
         else:
             service.run(runtime=runtime)
         return {"service": service.serialized, "runtime": runtime}
@@ -342,6 +494,70 @@ class AutomationController(BaseController):
             "update_time": workflow.last_modified,
         }
 
+    def state_delta(self, snapshot, state):
+        delta = {}
+        for key, value in list(state.items()):
+            if key == "summary":
+                continue
+            if isinstance(value, dict):
+                value = self.state_delta(snapshot.setdefault(key, {}), value)
+                if value:
+                    delta[key] = value
+            elif snapshot.get(key) != value:
+                snapshot[key] = delta[key] = value
+        return delta
+
+    def runtime_events(self, runtime, stream):
+        events = []
+        if stream["line"] >= 0:
+            live_logs = self.run_store.read_logs(runtime, stream["line"])
+            if live_logs and live_logs[0]:
+                logs, line = live_logs
+                data = {"logs": logs, "start": stream["line"], "line": line}
+                events.append(("logs", {"runtime": runtime, **data}))
+                stream["line"] = line
+        state = self.run_store.get_state(runtime)
+        if state is None:
+            stream["ended"] = True
+            events.append(("end", {"runtime": runtime, "line": stream["line"]}))
+        else:
+            delta = self.state_delta(stream["snapshot"], state)
+            if delta:
+                events.append(("state", {"runtime": runtime, "delta": delta}))
+        return events
+
+    def run_events(self, runs=False, runtimes=None):
+        settings, ticks = self.settings["automation"]["run_events"], 0
+        streams = {
+            runtime: {"line": line, "snapshot": {}}
+            for runtime, line in (runtimes or {}).items()
+        }
+        last_runs = None
+        while runs or streams:
+            events = []
+            for runtime, stream in list(streams.items()):
+                events.extend(self.runtime_events(runtime, stream))
+                if stream.get("ended"):
+                    streams.pop(runtime)
+            if runs:
+                current_runs = self.run_statuses()
+                if current_runs != last_runs:
+                    last_runs = current_runs
+                    events.append(("runs", current_runs))
+            ticks += 1
+            if not events and not ticks % settings["keepalive"]:
+                events.append(("keepalive", {}))
+            for event, data in events:
+                yield self.format_event(event, data)
+            sleep(settings["interval"])
+
+    def run_statuses(self):
+        return self.run_store.statuses()
+
+    @staticmethod
+    def format_event(event, data):
+        return f"event: {event}\ndata: {dumps(data, default=str)}\n\n"
+
     def get_service_state(self, path, runtime=None):
         service_id = path.split(">")[-1]
         state, service = None, fetch("service", id=service_id)
@@ -351,7 +567,9 @@ class AutomationController(BaseController):
         if runs and runtime != "normal":
             if runtime == "latest":
                 runtime = runs[-1].parent_runtime
-            state = self.run_db.get(runtime) or fetch("run", runtime=runtime).state
+            state = (
+                self.run_store.get_state(runtime) or fetch("run", runtime=runtime).state
+            )
         return {
             "service": service.to_dict(include=["services", "edges"]),
             "runtimes": [(r.parent_runtime, r.creator) for r in runs],
@@ -370,8 +588,10 @@ class AutomationController(BaseController):
         ]
 
     def calendar_init(self, type):
-        results = {}
-        for instance in fetch_all(type):
+        results, instances = {}, fetch_all(type)
+        if type == "task":
+            models["task"].prefetch_next_run_times(instances)
+        for instance in instances:
             if getattr(instance, "workflow", None):
                 continue
             date = getattr(instance, "next_run_time" if type == "task" else "runtime")
@@ -382,9 +602,25 @@ class AutomationController(BaseController):
                 }
         return results
 
+    def get_next_run_times(self, job_ids=None):
+        jobs = self.job_store.jobs_t
+        query = select([jobs.c.id, jobs.c.next_run_time])
+        if job_ids is not None:
+            query = query.where(jobs.c.id.in_(job_ids))
+        return {
+            job_id: utc_timestamp_to_datetime(timestamp).astimezone(
+                self.scheduler.timezone
+            )
+            for job_id, timestamp in self.job_store.engine.execute(query)
+            if timestamp is not None
+        }
+
     def scheduler_action(self, action):
         getattr(self.scheduler, action)()
 
+    def get_scheduler_status(self):
+        return self.scheduler_executor.status
+
     def task_action(self, action, task_id):
         try:
             return getattr(fetch("task", id=task_id), action)()
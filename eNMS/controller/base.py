@@ -1,7 +1,7 @@
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
-from collections import Counter
+from collections import Counter, defaultdict
 from datetime import datetime
-from difflib import SequenceMatcher
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -15,6 +15,7 @@ from json import load
 from ldap3 import ALL, Server
 from logging import basicConfig, error, info, StreamHandler, warning
 from logging.handlers import RotatingFileHandler
+from multiprocessing import current_process
 from os import environ, scandir
 from os.path import exists
 from pathlib import Path
@@ -24,26 +25,38 @@ from requests.packages.urllib3.util.retry import Retry
 from ruamel import yaml
 from smtplib import SMTP
 from string import punctuation
-from sqlalchemy import and_, func, or_
+from sqlalchemy import and_, cast, JSON, or_, Text
 from sqlalchemy.exc import IntegrityError, InvalidRequestError
-from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm import ColumnProperty, configure_mappers, selectinload
 from sys import path as sys_path
 from tacacs_plus.client import TACACSClient
+from threading import Thread
+from time import sleep
 from uuid import getnode
 
 from eNMS.database import Base, DIALECT, engine, Session
 from eNMS.database.events import configure_events
 from eNMS.database.functions import (
+    bulk_fetch,
     count,
+    create_missing_indexes,
+    create_search_index,
     delete,
     factory,
     fetch,
     fetch_all,
-    get_query_count,
+    get_cached_query_count,
+    get_table_count,
+    search_index_query,
+    search_properties,
 )
 from eNMS.models import models, model_properties, relationships
 from eNMS.properties import private_properties, property_names
 from eNMS.properties.database import import_classes
+from eNMS.controller.connections import ConnectionPool
+from eNMS.controller.diff import get_opcodes
+from eNMS.controller.scheduler import BudgetExecutor, SharedJobStore
+from eNMS.controller.store import RunStore, SqliteRunStore
 from eNMS.controller.syslog import SyslogServer
 from eNMS.setup import settings, properties, rbac
 
@@ -72,6 +85,13 @@ class BaseController:
         self.properties = properties
         self.load_custom_properties()
         self.path = Path.cwd()
+        process = current_process().name
+        if "PoolWorker" in process:
+            self.process_type = "pool_worker"
+        elif process.startswith("Runner"):
+            self.process_type = "runner"
+        else:
+            self.process_type = "server"
         self.init_scheduler()
         if settings["tacacs"]["active"]:
             self.init_tacacs_client()
@@ -79,21 +99,25 @@ class BaseController:
             self.init_ldap_client()
         if settings["vault"]["active"]:
             self.init_vault_client()
-        if settings["syslog"]["active"]:
+        if settings["syslog"]["active"] and self.process_type == "server":
             self.init_syslog_server()
         if settings["paths"]["custom_code"]:
             sys_path.append(settings["paths"]["custom_code"])
         self.fetch_version()
         self.init_logs()
         self.init_connection_pools()
+        self.init_run_store()
 
     def configure_database(self):
         self.init_services()
         Base.metadata.create_all(bind=engine)
+        create_missing_indexes()
+        self.search_index = create_search_index()
         configure_mappers()
         configure_events(self)
         self.init_forms()
-        self.clean_database()
+        if self.process_type == "server":
+            self.clean_database()
         if not fetch("user", allow_none=True, name="admin"):
             self.configure_server_id()
             self.create_admin_user()
@@ -112,6 +136,8 @@ class BaseController:
 
     def clean_database(self):
         for run in fetch("run", all_matches=True, allow_none=True, status="Running"):
+            if self.run_store.get_state(run.parent_runtime):
+                continue
             run.status = "Aborted (app reload)"
         Session.commit()
 
@@ -179,6 +205,9 @@ class BaseController:
         )
 
     def init_connection_pools(self):
+        self.connections_cache = ConnectionPool(
+            **self.settings["automation"]["connection_pool"]
+        )
         self.request_session = RequestSession()
         retry = Retry(**self.settings["requests"]["retries"])
         for protocol in ("http", "https"):
@@ -187,23 +216,43 @@ class BaseController:
                 HTTPAdapter(max_retries=retry, **self.settings["requests"]["pool"],),
             )
 
+    def init_run_store(self):
+        settings = self.settings["automation"]["run_store"]
+        shared = settings["backend"] == "sqlite" and self.process_type != "pool_worker"
+        store = SqliteRunStore if shared else RunStore
+        self.run_store = store(self.run_db, self.run_logs, self.service_db, **settings)
+        Thread(target=self.result_flusher, daemon=True).start()
+
     def init_scheduler(self):
+        lock_file = self.path / "scheduler.lock"
+        if self.settings["database"]["job_store"] == "database":
+            self.job_store = SharedJobStore(lock_file, engine=engine)
+        else:
+            self.job_store = SharedJobStore(lock_file, url="sqlite:///jobs.sqlite")
+        self.scheduler_executor = BudgetExecutor(
+            **self.settings["automation"]["scheduler"]
+        )
         self.scheduler = BackgroundScheduler(
             {
-                "apscheduler.jobstores.default": {
-                    "type": "sqlalchemy",
-                    "url": "sqlite:///jobs.sqlite",
-                },
-                "apscheduler.executors.default": {
-                    "class": "apscheduler.executors.pool:ThreadPoolExecutor",
-                    "max_workers": "50",
-                },
                 "apscheduler.job_defaults.misfire_grace_time": "5",
                 "apscheduler.job_defaults.coalesce": "true",
                 "apscheduler.job_defaults.max_instances": "3",
             }
         )
+        self.scheduler.add_executor(self.scheduler_executor)
+        self.scheduler.add_jobstore(self.job_store)
+        self.scheduler.add_jobstore(MemoryJobStore(), "local")
+        if self.process_type != "server":
+            return
         self.scheduler.start()
+        Thread(target=self.scheduler_election, daemon=True).start()
+
+    def scheduler_election(self):
+        interval = self.settings["automation"]["scheduler"]["election_interval"]
+        while self.scheduler.running:
+            if self.job_store.elect():
+                self.scheduler.wakeup()
+            sleep(interval)
 
     def init_forms(self):
         for file in (self.path / "eNMS" / "forms").glob("**/*.py"):
@@ -314,8 +363,7 @@ class BaseController:
     def compare(self, type, result1, result2):
         first = self.str_dict(getattr(fetch(type, id=result1), "result")).splitlines()
         second = self.str_dict(getattr(fetch(type, id=result2), "result")).splitlines()
-        opcodes = SequenceMatcher(None, first, second).get_opcodes()
-        return {"first": first, "second": second, "opcodes": opcodes}
+        return {"first": first, "second": second, "opcodes": get_opcodes(first, second)}
 
     def build_filtering_constraints(self, obj_type, **kwargs):
         model, constraints = models[obj_type], []
@@ -324,15 +372,22 @@ class BaseController:
             if not value:
                 continue
             filter = kwargs["form"].get(f"{property}_filter")
+            column = getattr(model, property)
+            if isinstance(getattr(column, "type", None), JSON):
+                column = cast(column, Text)
             if value in ("bool-true", "bool-false"):
-                constraint = getattr(model, property) == (value == "bool-true")
+                constraint = column == (value == "bool-true")
             elif filter == "equality":
-                constraint = getattr(model, property) == value
+                constraint = column == value
+            elif filter == "prefix":
+                constraint = column.startswith(value)
             elif not filter or filter == "inclusion" or DIALECT == "sqlite":
-                constraint = getattr(model, property).contains(value)
+                constraint = column.contains(value)
+                if self.search_index and (obj_type, property) in search_properties:
+                    constraint = model.id.in_(search_index_query(property, value))
             else:
                 regex_operator = "regexp" if DIALECT == "mysql" else "~"
-                constraint = getattr(model, property).op(regex_operator)(value)
+                constraint = column.op(regex_operator)(value)
             constraints.append(constraint)
         for related_model, relation_properties in relationships[obj_type].items():
             relation_ids = [int(id) for id in kwargs["form"].get(related_model, [])]
@@ -368,17 +423,33 @@ class BaseController:
             "total_count": results.count(),
         }
 
-    def table_filtering(self, table, **kwargs):
-        model = models[table]
-        ordering = getattr(
-            getattr(
-                model,
-                kwargs["columns"][int(kwargs["order"][0]["column"])]["data"],
-                None,
-            ),
-            kwargs["order"][0]["dir"],
-            None,
+    def keyset_constraint(self, model, column, direction, value, id):
+        def after(first, second):
+            return first > second if direction == "asc" else first < second
+
+        nulls_last = (DIALECT == "postgresql") == (direction == "asc")
+        tie = and_(
+            column.is_(None) if value is None else column == value, after(model.id, id)
         )
+        if value is None:
+            return tie if nulls_last else or_(column.isnot(None), tie)
+        constraint = or_(after(column, value), tie)
+        return or_(constraint, column.is_(None)) if nulls_last else constraint
+
+    def load_subclass_properties(self, model, instances):
+        subclass_ids = defaultdict(list)
+        for instance in instances:
+            if type(instance) is not model:
+                subclass_ids[instance.type].append(instance.id)
+        for subclass, ids in subclass_ids.items():
+            bulk_fetch(subclass, ids)
+
+    def table_filtering(self, table, **kwargs):
+        model, order = models[table], kwargs["order"][0]
+        column = getattr(model, kwargs["columns"][int(order["column"])]["data"], None)
+        ordering = getattr(column, order["dir"], None)
+        keyset_column = isinstance(getattr(column, "property", None), ColumnProperty)
+        start, length = int(kwargs["start"]), int(kwargs["length"])
         constraints = self.build_filtering_constraints(table, **kwargs)
         if table == "result":
             constraints.append(
@@ -405,17 +476,41 @@ class BaseController:
         result = Session.query(model).filter(and_(*constraints))
         if ordering:
             result = result.order_by(ordering())
-        return {
+            if column.key != "id":
+                result = result.order_by(getattr(model.id, order["dir"])())
+        filtered = bool(constraints)
+        page = result.options(
+            *(
+                selectinload(getattr(model, relationship))
+                for relationship in getattr(model, "eager_load", [])
+            )
+        )
+        keyset = kwargs.get("keyset")
+        if keyset and start and ordering and keyset_column:
+            page = page.filter(
+                self.keyset_constraint(model, column, order["dir"], *keyset)
+            )
+            instances = page.limit(length).all()
+        else:
+            instances = page.limit(length).offset(start).all()
+        self.load_subclass_properties(model, instances)
+        if table == "task":
+            model.prefetch_next_run_times(instances)
+        total = get_table_count(table)
+        response = {
             "draw": int(kwargs["draw"]),
-            "recordsTotal": Session.query(func.count(model.id)).scalar(),
-            "recordsFiltered": get_query_count(result),
-            "data": [
-                obj.table_properties(**kwargs)
-                for obj in result.limit(int(kwargs["length"]))
-                .offset(int(kwargs["start"]))
-                .all()
-            ],
+            "recordsTotal": total,
+            "recordsFiltered": get_cached_query_count(result) if filtered else total,
+            "data": [obj.table_properties(**kwargs) for obj in instances],
         }
+        if instances and ordering and keyset_column:
+            value = getattr(instances[-1], column.key)
+            if value is None or isinstance(value, (bool, int, float, str)):
+                response["keyset"] = {
+                    "start": start + length,
+                    "value": [value, instances[-1].id],
+                }
+        return response
 
     def allowed_file(self, name, allowed_modules):
         allowed_syntax = "." in name
@@ -488,8 +583,12 @@ class BaseController:
                 if not filepath.exists():
                     continue
                 with open(filepath) as file:
-                    setattr(device, data, file.read())
+                    self.update_device_data(device, data, file.read())
         Session.commit()
-        for pool in fetch_all("pool"):
-            if pool.device_configuration or pool.device_operational_data:
-                pool.compute_pool()
+        self.update_all_pools(
+            [
+                pool
+                for pool in fetch_all("pool")
+                if pool.device_configuration or pool.device_operational_data
+            ]
+        )
@@ -0,0 +1,229 @@
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from logging import info
+from threading import Condition, get_ident, Thread
+from time import sleep, time
+
+
+class ConnectionPool:
+    def __init__(self, **settings):
+        self.max_size = settings["max_size"]
+        self.max_per_device = settings["max_per_device"]
+        self.idle_timeout = settings["idle_timeout"]
+        self.probe_interval = settings["probe_interval"]
+        self.reaper_interval = settings["reaper_interval"]
+        self.checkout_timeout = settings["checkout_timeout"]
+        self.executor = ThreadPoolExecutor(settings["reaper_threads"])
+        self.reset()
+        Thread(target=self.reaper, daemon=True).start()
+
+    def reset(self):
+        self.connections, self.lock = OrderedDict(), Condition()
+        self.metrics = Counter()
+
+    @property
+    def status(self):
+        with self.lock:
+            in_use = sum(entry["in_use"] for entry in self.connections.values())
+            return {**self.metrics, "size": len(self.connections), "in_use": in_use}
+
+    @staticmethod
+    def entry(connection=None, session=None):
+        now = time()
+        return {
+            "connection": connection,
+            "in_use": True,
+            "owner": get_ident(),
+            "last_checked": now,
+            "last_used": now,
+            "session": session,
+        }
+
+    def acquire(self, key):
+        deadline = time() + self.checkout_timeout
+        while True:
+            entry = self.connections.get(key)
+            if not entry or not entry["in_use"] or entry["owner"] == get_ident():
+                return entry
+            if time() > deadline:
+                raise Exception(f"Connection to '{key[2]}' is still in use")
+            self.lock.wait(deadline - time())
+
+    def get(self, library, runtime, device, session=None):
+        key = (library, runtime, device)
+        with self.lock:
+            entry = self.acquire(key)
+            if not entry and session:
+                entry = self.checkout(key, session)
+            if not entry:
+                self.reserve(key, device)
+                return
+            if entry["connection"] is None:
+                return
+            entry["in_use"], entry["owner"] = True, get_ident()
+            self.connections.move_to_end(key)
+            checked = time() - entry["last_checked"] < self.probe_interval
+        connection = entry["connection"]
+        if not checked and not self.is_alive(library, connection):
+            with self.lock:
+                self.metrics["probe_failures"] += 1
+                entry["connection"] = None
+            self.disconnect(library, connection)
+            return
+        with self.lock:
+            entry["last_used"] = entry["last_checked"] = time()
+            self.metrics["reused"] += 1
+        return connection
+
+    def checkout(self, key, session):
+        for session_key, entry in self.connections.items():
+            if session_key[2] != key[2] or entry["in_use"]:
+                continue
+            if entry["session"] == session:
+                self.connections[key] = self.connections.pop(session_key)
+                self.metrics["checkouts"] += 1
+                return entry
+
+    def checkin(self, library, device, entry):
+        entry["in_use"], entry["owner"], entry["last_used"] = False, None, time()
+        self.connections[(library, ("session", id(entry)), device)] = entry
+        self.metrics["checkins"] += 1
+
+    def reserve(self, key, device):
+        device_keys = [other for other in self.connections if other[2] == device]
+        if len(device_keys) >= self.max_per_device:
+            self.evict(device_keys, device)
+        if len(self.connections) >= self.max_size:
+            self.evict(self.connections, device)
+        self.connections[key] = self.entry()
+
+    def add(self, library, runtime, device, connection, session=None):
+        key, previous = (library, runtime, device), None
+        try:
+            with self.lock:
+                entry = self.acquire(key)
+                if not entry:
+                    self.reserve(key, device)
+                else:
+                    previous = entry["connection"]
+                self.connections[key] = self.entry(connection, session)
+                self.metrics["opened"] += 1
+        except Exception:
+            self.disconnect(library, connection)
+            raise
+        if previous:
+            self.executor.submit(self.disconnect, library, previous)
+
+    def evict(self, keys, device):
+        for key in list(keys):
+            if not self.connections[key]["in_use"]:
+                self.metrics["evicted"] += 1
+                entry = self.connections.pop(key)
+                self.executor.submit(self.disconnect, key[0], entry["connection"])
+                return
+        raise Exception(f"Connection pool limit reached (device '{device}')")
+
+    def release(self, runtime, device):
+        with self.lock:
+            for library in ("netmiko", "napalm"):
+                key = (library, runtime, device)
+                entry = self.connections.get(key)
+                if not entry or entry["owner"] != get_ident():
+                    continue
+                if entry["connection"] is None:
+                    self.connections.pop(key)
+                else:
+                    entry["in_use"], entry["owner"] = False, None
+                    entry["last_used"] = time()
+            self.lock.notify_all()
+
+    def close(self, library, runtime, device, discard=False):
+        key = (library, runtime, device)
+        with self.lock:
+            entry = self.acquire(key)
+            if not entry:
+                return
+            self.connections.pop(key)
+            self.lock.notify_all()
+            if entry["connection"] is None:
+                return
+            if entry["session"] and not discard:
+                self.checkin(library, device, entry)
+                return "released"
+        self.close_connection(library, entry["connection"])
+        return "closed"
+
+    def close_runtime(self, runtime):
+        entries = []
+        with self.lock:
+            for key in [key for key in self.connections if key[1] == runtime]:
+                entry = self.connections.pop(key)
+                if entry["connection"] is None:
+                    continue
+                if entry["session"]:
+                    self.checkin(key[0], key[2], entry)
+                else:
+                    entries.append((key, entry))
+            self.lock.notify_all()
+        for key, entry in entries:
+            self.executor.submit(self.disconnect, key[0], entry["connection"])
+
+    def close_connection(self, library, connection):
+        connection.disconnect() if library == "netmiko" else connection.close()
+        with self.lock:
+            self.metrics["closed"] += 1
+
+    def disconnect(self, library, connection):
+        try:
+            self.close_connection(library, connection)
+        except Exception as exc:
+            info(f"Error while closing {library} connection ({exc})")
+
+    @staticmethod
+    def is_alive(library, connection):
+        try:
+            if library == "napalm":
+                return connection.is_alive().get("is_alive", False)
+            connection.find_prompt()
+            return True
+        except Exception:
+            return False
+
+    def probe(self, key, entry):
+        alive = self.is_alive(key[0], entry["connection"])
+        with self.lock:
+            if alive:
+                entry["in_use"], entry["owner"] = False, None
+                entry["last_checked"] = time()
+            else:
+                self.metrics["probe_failures"] += 1
+                if self.connections.get(key) is entry:
+                    self.connections.pop(key)
+            self.lock.notify_all()
+        if not alive:
+            self.disconnect(key[0], entry["connection"])
+
+    def reap(self):
+        now, expired, stale = time(), [], []
+        with self.lock:
+            for key, entry in list(self.connections.items()):
+                if entry["in_use"]:
+                    continue
+                if now - entry["last_used"] > self.idle_timeout:
+                    expired.append((key, self.connections.pop(key)))
+                elif now - entry["last_checked"] > self.probe_interval:
+                    entry["in_use"], entry["owner"] = True, "probe"
+                    stale.append((key, entry))
+            self.metrics["expired"] += len(expired)
+        for key, entry in expired:
+            self.executor.submit(self.disconnect, key[0], entry["connection"])
+        for key, entry in stale:
+            self.executor.submit(self.probe, key, entry)
+
+    def reaper(self):
+        while True:
+            sleep(self.reaper_interval)
+            try:
+                self.reap()
+            except Exception as exc:
+                info(f"Connection pool reaper failed ({exc})")
@@ -0,0 +1,131 @@
+from bisect import bisect_left
+from collections import Counter
+
+
+def unique_anchors(a, alo, ahi, b, blo, bhi):
+    count_a, count_b = Counter(a[alo:ahi]), Counter(b[blo:bhi])
+    positions = {
+        b[j]: j for j in range(blo, bhi) if count_b[b[j]] == 1 and count_a[b[j]] == 1
+    }
+    candidates = [(i, positions[a[i]]) for i in range(alo, ahi) if a[i] in positions]
+    tails, tail_indices, previous = [], [], []
+    for index, (_, j) in enumerate(candidates):
+        position = bisect_left(tails, j)
+        previous.append(tail_indices[position - 1] if position else None)
+        if position == len(tails):
+            tails.append(j)
+            tail_indices.append(index)
+        else:
+            tails[position], tail_indices[position] = j, index
+    anchors, index = [], tail_indices[-1] if tail_indices else None
+    while index is not None:
+        anchors.append(candidates[index])
+        index = previous[index]
+    return anchors[::-1]
+
+
+def middle_snake(a, alo, ahi, b, blo, bhi, max_cost):
+    n, m = ahi - alo, bhi - blo
+    delta, forward, backward = n - m, {1: 0}, {1: 0}
+    for d in range(min((n + m + 1) // 2, max_cost // 2) + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or k != d and forward[k - 1] < forward[k + 1]:
+                x = forward[k + 1]
+            else:
+                x = forward[k - 1] + 1
+            start, y = x, x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x, y = x + 1, y + 1
+            forward[k] = x
+            overlap = delta % 2 and abs(delta - k) < d
+            if overlap and x + backward[delta - k] >= n:
+                return start, start - k, x, y
+        for k in range(-d, d + 1, 2):
+            if k == -d or k != d and backward[k - 1] < backward[k + 1]:
+                x = backward[k + 1]
+            else:
+                x = backward[k - 1] + 1
+            start, y = x, x - k
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x, y = x + 1, y + 1
+            backward[k] = x
+            overlap = not delta % 2 and abs(delta - k) <= d
+            if overlap and x + forward[delta - k] >= n:
+                return n - x, m - y, n - start, m - start + k
+
+
+def greedy_matches(a, alo, ahi, b, blo, bhi, window=16):
+    matches, i, j = [], alo, blo
+    while i < ahi and j < bhi:
+        if a[i] == b[j]:
+            matches.append((i, j))
+            i, j = i + 1, j + 1
+            continue
+        for offset in range(1, window + 1):
+            if j + offset < bhi and a[i] == b[j + offset]:
+                j += offset
+                break
+            if i + offset < ahi and a[i + offset] == b[j]:
+                i += offset
+                break
+        else:
+            i, j = i + 1, j + 1
+    return matches
+
+
+def get_opcodes(first, second, max_cost=500):
+    if first == second:
+        return [["equal", 0, len(first), 0, len(second)]] if first else []
+    codes = {}
+    a = [codes.setdefault(line, len(codes)) for line in first]
+    b = [codes.setdefault(line, len(codes)) for line in second]
+    matches, regions = [], [(0, len(a), 0, len(b))]
+    while regions:
+        alo, ahi, blo, bhi = regions.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo, blo = alo + 1, blo + 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi, bhi = ahi - 1, bhi - 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = unique_anchors(a, alo, ahi, b, blo, bhi)
+        if not anchors:
+            if set(a[alo:ahi]).isdisjoint(b[blo:bhi]):
+                continue
+            snake = middle_snake(a, alo, ahi, b, blo, bhi, max_cost)
+            if not snake:
+                matches.extend(greedy_matches(a, alo, ahi, b, blo, bhi))
+                continue
+            x, y, u, v = snake
+            matches.extend((alo + i, blo + i - x + y) for i in range(x, u))
+            regions.append((alo, alo + x, blo, blo + y))
+            regions.append((alo + u, ahi, blo + v, bhi))
+            continue
+        matches.extend(anchors)
+        for i, j in anchors + [(ahi, bhi)]:
+            regions.append((alo, i, blo, j))
+            alo, blo = i + 1, j + 1
+    blocks = []
+    for i, j in sorted(matches):
+        if (
+            blocks
+            and blocks[-1][0] + blocks[-1][2] == i
+            and blocks[-1][1] + blocks[-1][2] == j
+        ):
+            blocks[-1][2] += 1
+        else:
+            blocks.append([i, j, 1])
+    opcodes, i, j = [], 0, 0
+    for match_i, match_j, size in blocks + [[len(a), len(b), 0]]:
+        if i < match_i and j < match_j:
+            opcodes.append(["replace", i, match_i, j, match_j])
+        elif i < match_i:
+            opcodes.append(["delete", i, match_i, j, match_j])
+        elif j < match_j:
+            opcodes.append(["insert", i, match_i, j, match_j])
+        if size:
+            opcodes.append(["equal", match_i, match_i + size, match_j, match_j + size])
+        i, j = match_i + size, match_j + size
+    return opcodes
@@ -0,0 +1,20 @@
+from eNMS.controller.diff import get_opcodes
+
+
+def make_delta(old, new):
+    old_lines, new_lines = old.splitlines(True), new.splitlines(True)
+    delta = []
+    for tag, i1, i2, j1, j2 in get_opcodes(old_lines, new_lines):
+        if tag == "equal":
+            delta.append([i1, i2])
+        elif tag != "delete":
+            delta.append("".join(new_lines[j1:j2]))
+    return delta
+
+
+def apply_delta(old, delta):
+    old_lines = old.splitlines(True)
+    return "".join(
+        item if isinstance(item, str) else "".join(old_lines[slice(*item)])
+        for item in delta
+    )
@@ -1,5 +1,7 @@
 from collections import Counter
+from datetime import datetime
 from flask_login import current_user
+from hashlib import sha256
 from logging import info
 from sqlalchemy import and_
 from subprocess import Popen
@@ -12,9 +14,18 @@ from xlwt import Workbook
 
 
 from eNMS.controller.base import BaseController
+from eNMS.controller.diff import get_opcodes
+from eNMS.controller.history import apply_delta, make_delta
 from eNMS.controller.ssh import SshConnection
 from eNMS.database import Session
-from eNMS.database.functions import delete_all, factory, fetch, fetch_all, objectify
+from eNMS.database.functions import (
+    bulk_fetch,
+    delete_all,
+    factory,
+    fetch,
+    fetch_all,
+    objectify,
+)
 from eNMS.models import models, model_properties, property_types
 from eNMS.properties import field_conversion
 
@@ -112,6 +123,94 @@ class InventoryController(BaseController):
         device = fetch("device", id=device_id)
         return {"configuration": device.configuration, "data": device.operational_data}
 
+    def update_device_data(self, device, data_type, content):
+        if self.settings["database"]["configuration_history"]["active"]:
+            changed = self.save_data_version(device, data_type, content)
+        else:
+            changed = getattr(device, data_type) != content
+        if changed:
+            setattr(device, data_type, content)
+        return changed
+
+    def save_data_version(self, device, data_type, content):
+        content_hash = sha256(content.encode("utf-8")).hexdigest()
+        model = models["data_version"]
+        last = (
+            Session.query(model)
+            .filter_by(device_id=device.id, data_type=data_type)
+            .order_by(model.version.desc())
+            .first()
+        )
+        if last and last.hash == content_hash:
+            return False
+        version = factory(
+            "data_version",
+            device=device.id,
+            data_type=data_type,
+            version=last.version + 1 if last else 1,
+            time=str(datetime.now()),
+            hash=content_hash,
+        )
+        interval = self.settings["database"]["configuration_history"][
+            "snapshot_interval"
+        ]
+        if last and version.version - last.base_version < interval:
+            current = getattr(device, data_type) or ""
+            if sha256(current.encode("utf-8")).hexdigest() != last.hash:
+                current = self.get_data_version(device.id, data_type, last.version)
+            delta = make_delta(current, content)
+            if len(str(delta)) < len(content):
+                version.base_version, version.delta = last.base_version, delta
+        if not version.base_version:
+            version.base_version, version.delta = version.version, content
+        return True
+
+    def get_data_versions(self, device_id, data_type):
+        model = models["data_version"]
+        versions = (
+            Session.query(model)
+            .filter_by(device_id=device_id, data_type=data_type)
+            .order_by(model.version.desc())
+        )
+        return [
+            {
+                "version": version.version,
+                "time": version.time,
+                "hash": version.hash,
+                "snapshot": version.is_snapshot,
+            }
+            for version in versions
+        ]
+
+    def get_data_version(self, device_id, data_type, version):
+        model, content = models["data_version"], ""
+        target = fetch(
+            "data_version",
+            device_id=device_id,
+            data_type=data_type,
+            version=int(version),
+        )
+        chain = (
+            Session.query(model)
+            .filter(
+                model.device_id == device_id,
+                model.data_type == data_type,
+                model.version.between(target.base_version, target.version),
+            )
+            .order_by(model.version)
+        )
+        for version in chain:
+            if version.is_snapshot:
+                content = version.delta
+            else:
+                content = apply_delta(content, version.delta)
+        return content
+
+    def compare_data_versions(self, device_id, data_type, version1, version2):
+        first = self.get_data_version(device_id, data_type, version1).splitlines()
+        second = self.get_data_version(device_id, data_type, version2).splitlines()
+        return {"first": first, "second": second, "opcodes": get_opcodes(first, second)}
+
     def get_session_log(self, session_id):
         return fetch("session", id=session_id).content
 
@@ -161,8 +260,7 @@ class InventoryController(BaseController):
                     info(f"{str(values)} could not be imported ({str(exc)})")
                     status = "Partial import (see logs)."
             Session.commit()
-        for pool in fetch_all("pool"):
-            pool.compute_pool()
+        self.update_all_pools()
         self.log("info", status)
         return status
 
@@ -181,15 +279,12 @@ class InventoryController(BaseController):
         for obj_type in ("device", "link"):
             string_objects = kwargs[f"string_{obj_type}s"]
             if string_objects:
-                objects = []
-                for name in [obj.strip() for obj in string_objects.split(",")]:
-                    obj = fetch(obj_type, allow_none=True, name=name)
-                    if not obj:
-                        return {
-                            "alert": f"{obj_type.capitalize()} '{name}' does not exist."
-                        }
-                    if obj not in objects:
-                        objects.append(obj)
+                names = [obj.strip() for obj in string_objects.split(",")]
+                objects, not_found = bulk_fetch(obj_type, names, "name")
+                if not_found:
+                    model = obj_type.capitalize()
+                    return {"alert": f"{model} '{not_found[0]}' does not exist."}
+                objects = list(dict.fromkeys(objects))
             else:
                 objects = objectify(obj_type, kwargs[f"{obj_type}s"])
             setattr(pool, f"{obj_type}_number", len(objects))
@@ -199,9 +294,15 @@ class InventoryController(BaseController):
     def update_pool(self, pool_id):
         fetch("pool", id=int(pool_id)).compute_pool()
 
-    def update_all_pools(self):
-        for pool in fetch_all("pool"):
-            pool.compute_pool()
+    def update_all_pools(self, pools=None):
+        if self.settings["database"]["pool_computation"] == "sql":
+            objects = None
+        else:
+            objects = {
+                class_type: fetch_all(class_type) for class_type in ("device", "link")
+            }
+        for pool in fetch_all("pool") if pools is None else pools:
+            pool.compute_pool(objects)
 
     def get_view_topology(self):
         return {
@@ -0,0 +1,63 @@
+from array import array
+from collections import deque
+from itertools import islice
+from os import pread
+from pathlib import Path
+from tempfile import TemporaryFile
+from threading import Lock
+
+from eNMS.setup import settings
+
+
+class RunLog:
+    def __init__(self):
+        self.size = settings["automation"]["log_buffer_size"]
+        self.lines, self.lock = deque(), Lock()
+        self.offsets, self.spill = array("q", [0]), None
+
+    def __len__(self):
+        return len(self.offsets) - 1 + len(self.lines)
+
+    def append(self, line):
+        self.extend((line,))
+
+    def extend(self, lines):
+        with self.lock:
+            self.lines.extend(lines)
+            if len(self.lines) > self.size:
+                overflow = len(self.lines) - self.size // 2
+                self.write([self.lines.popleft() for _ in range(overflow)])
+
+    def write(self, lines):
+        if not self.spill:
+            folder = Path.cwd() / "logs" / "runs"
+            folder.mkdir(parents=True, exist_ok=True)
+            self.spill = TemporaryFile(dir=folder, buffering=0)
+        data = [line.encode("utf-8") for line in lines]
+        for line in data:
+            self.offsets.append(self.offsets[-1] + len(line))
+        self.spill.write(b"".join(data))
+
+    def read(self, start=0, limit=None):
+        limit = limit or self.size
+        with self.lock:
+            spilled = len(self.offsets) - 1
+            if start >= spilled:
+                stop = start - spilled + limit
+                lines = list(islice(self.lines, start - spilled, stop))
+            else:
+                end = min(spilled, start + limit)
+                first, last = self.offsets[start], self.offsets[end]
+                data, lines = pread(self.spill.fileno(), last - first, first), []
+                for index in range(start, end):
+                    begin = self.offsets[index] - first
+                    stop = self.offsets[index + 1] - first
+                    lines.append(data[begin:stop].decode("utf-8"))
+                lines.extend(islice(self.lines, limit - len(lines)))
+        return lines, start + len(lines)
+
+    def dump(self):
+        lines, _ = self.read(0, len(self))
+        if self.spill:
+            self.spill.close()
+        return lines
@@ -0,0 +1,110 @@
+from apscheduler.events import EVENT_JOB_MISSED
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.base import MaxInstancesReachedError
+from collections import Counter, deque
+from datetime import datetime
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_UN
+from logging import warning
+from pytz import utc
+
+
+class BudgetExecutor(ThreadPoolExecutor):
+    def __init__(self, **settings):
+        super().__init__(settings["max_workers"])
+        self.max_runs = settings["max_runs"]
+        self.max_deferred_runs = settings["max_deferred_runs"]
+        self.max_runs_per_service = settings["max_runs_per_service"]
+        self.running, self.deferred, self.counters = Counter(), deque(), Counter()
+        self.job_services = {}
+
+    @property
+    def status(self):
+        return {
+            "running": self.running["total"],
+            "queued": len(self.deferred),
+            **{key: self.counters[key] for key in ("deferred", "dropped", "missed")},
+        }
+
+    def has_budget(self, service):
+        if self.running["total"] >= self.max_runs:
+            return False
+        service_limit = self.max_runs_per_service
+        return not service_limit or self.running[service] < service_limit
+
+    def start_job(self, job, run_times):
+        service = self.job_services[job.id] = job.args[0] if job.args else None
+        self.running["total"] += 1
+        self.running[service] += 1
+        super()._do_submit_job(job, run_times)
+
+    def submit_job(self, job, run_times):
+        with self._lock:
+            if self._instances[job.id] >= job.max_instances:
+                self.counters["dropped"] += 1
+                warning(f"Run of job '{job.id}' dropped: maximum instances reached")
+            super().submit_job(job, run_times)
+
+    def _do_submit_job(self, job, run_times):
+        service = job.args[0] if job.args else None
+        if self.has_budget(service):
+            self.start_job(job, run_times)
+        elif len(self.deferred) < self.max_deferred_runs:
+            self.deferred.append(job)
+            self.counters["deferred"] += 1
+        else:
+            self.counters["dropped"] += 1
+            warning(f"Run of job '{job.id}' dropped: deferred run queue is full")
+            raise MaxInstancesReachedError(job)
+
+    def release(self, job_id):
+        with self._lock:
+            service = self.job_services.get(job_id)
+            if not self._instances.get(job_id):
+                self.job_services.pop(job_id, None)
+            self.running["total"] -= 1
+            self.running[service] -= 1
+            for _ in range(len(self.deferred)):
+                job = self.deferred.popleft()
+                if self.has_budget(job.args[0] if job.args else None):
+                    self.start_job(job, [datetime.now(utc)])
+                else:
+                    self.deferred.append(job)
+
+    def _run_job_success(self, job_id, events):
+        self.counters["missed"] += sum(
+            event.code == EVENT_JOB_MISSED for event in events
+        )
+        super()._run_job_success(job_id, events)
+        self.release(job_id)
+
+    def _run_job_error(self, job_id, exc, traceback=None):
+        super()._run_job_error(job_id, exc, traceback)
+        self.release(job_id)
+
+
+class SharedJobStore(SQLAlchemyJobStore):
+    def __init__(self, lock_file, **kwargs):
+        super().__init__(**kwargs)
+        self.lock_file, self.leader = open(lock_file, "a"), False
+
+    def elect(self):
+        if not self.leader:
+            try:
+                flock(self.lock_file, LOCK_EX | LOCK_NB)
+                self.leader = True
+            except OSError:
+                pass
+        return self.leader
+
+    def get_due_jobs(self, now):
+        return super().get_due_jobs(now) if self.leader else []
+
+    def get_next_run_time(self):
+        return super().get_next_run_time() if self.leader else None
+
+    def shutdown(self):
+        if self.leader:
+            flock(self.lock_file, LOCK_UN)
+            self.leader = False
+        super().shutdown()
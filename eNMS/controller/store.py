@@ -0,0 +1,190 @@
+from json import dumps, loads
+from logging import error
+from sqlite3 import connect
+from threading import local, Lock, Thread
+from time import sleep, time
+
+
+class RunStore:
+    def __init__(self, run_db, run_logs, service_db, **settings):
+        self.run_db, self.run_logs, self.service_db = run_db, run_logs, service_db
+
+    def get_state(self, runtime):
+        return self.run_db.get(runtime)
+
+    def statuses(self):
+        return {
+            runtime: {
+                "status": state["status"],
+                "progress": dict(state.get("progress", {}).get("device", {})),
+            }
+            for runtime, state in list(self.run_db.items())
+        }
+
+    def read_logs(self, runtime, start=0):
+        run_log = self.run_logs.get(runtime)
+        return run_log.read(start) if run_log else None
+
+    def stop(self, runtime):
+        state = self.run_db.get(runtime)
+        if not state or state["status"] != "Running":
+            return False
+        state["status"] = "stop"
+        return True
+
+    def update_runs(self, service_id, increment):
+        self.service_db[service_id]["runs"] += increment
+        return self.service_db[service_id]["runs"]
+
+    def finish(self, runtime):
+        pass
+
+
+class SqliteRunStore(RunStore):
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS run_state "
+        "(runtime TEXT PRIMARY KEY, status TEXT, state TEXT, updated REAL)",
+        "CREATE TABLE IF NOT EXISTS run_log "
+        "(runtime TEXT, line INTEGER, content TEXT, PRIMARY KEY (runtime, line))",
+        "CREATE TABLE IF NOT EXISTS run_stop (runtime TEXT PRIMARY KEY)",
+        "CREATE TABLE IF NOT EXISTS service_runs "
+        "(service_id INTEGER PRIMARY KEY, runs INTEGER)",
+    )
+
+    def __init__(self, *args, database, sync_interval, expiry, **settings):
+        super().__init__(*args)
+        self.database, self.sync_interval, self.expiry = database, sync_interval, expiry
+        self.local, self.lock, self.published = local(), Lock(), {}
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection as connection:
+            for statement in self.schema:
+                connection.execute(statement)
+        Thread(target=self.synchronizer, daemon=True).start()
+
+    @property
+    def connection(self):
+        if not hasattr(self.local, "connection"):
+            self.local.connection = connect(self.database, timeout=30)
+            self.local.connection.execute("PRAGMA synchronous=NORMAL")
+        return self.local.connection
+
+    def query(self, statement, *args):
+        return self.connection.execute(statement, (*args, time() - self.expiry))
+
+    def get_state(self, runtime):
+        state = self.run_db.get(runtime)
+        if state is not None:
+            return state
+        row = self.query(
+            "SELECT state FROM run_state WHERE runtime = ? AND updated > ?", runtime
+        ).fetchone()
+        return loads(row[0]) if row else None
+
+    def statuses(self):
+        rows = self.query(
+            "SELECT runtime, status, json_extract(state, '$.progress.device') "
+            "FROM run_state WHERE updated > ?"
+        )
+        return {
+            **{
+                runtime: {"status": status, "progress": loads(progress or "{}")}
+                for runtime, status, progress in rows
+            },
+            **super().statuses(),
+        }
+
+    def read_logs(self, runtime, start=0):
+        if runtime in self.run_logs:
+            return super().read_logs(runtime, start)
+        live = self.query(
+            "SELECT 1 FROM run_state WHERE runtime = ? AND updated > ?", runtime
+        ).fetchone()
+        if not live:
+            return None
+        rows = self.connection.execute(
+            "SELECT content FROM run_log WHERE runtime = ? AND line >= ? ORDER BY line",
+            (runtime, start),
+        ).fetchall()
+        return [content for content, in rows], start + len(rows)
+
+    def stop(self, runtime):
+        if runtime in self.run_db:
+            return super().stop(runtime)
+        state = self.get_state(runtime)
+        if not state or state["status"] != "Running":
+            return False
+        with self.connection as connection:
+            connection.execute("INSERT OR IGNORE INTO run_stop VALUES (?)", (runtime,))
+        return True
+
+    def update_runs(self, service_id, increment):
+        with self.connection as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO service_runs VALUES (?, 0)", (service_id,)
+            )
+            connection.execute(
+                "UPDATE service_runs SET runs = runs + ? WHERE service_id = ?",
+                (increment, service_id),
+            )
+            return connection.execute(
+                "SELECT runs FROM service_runs WHERE service_id = ?", (service_id,)
+            ).fetchone()[0]
+
+    def finish(self, runtime):
+        with self.lock, self.connection as connection:
+            self.published.pop(runtime, None)
+            for table in ("run_state", "run_log", "run_stop"):
+                connection.execute(f"DELETE FROM {table} WHERE runtime = ?", (runtime,))
+
+    def publish(self, connection, runtime, state, now):
+        data, line = self.published.get(runtime, (None, 0))
+        try:
+            state_data = dumps(state, default=str)
+        except RuntimeError:
+            state_data = data
+        if state_data != data:
+            connection.execute(
+                "INSERT OR REPLACE INTO run_state VALUES (?, ?, ?, ?)",
+                (runtime, state["status"], state_data, now),
+            )
+        else:
+            connection.execute(
+                "UPDATE run_state SET updated = ? WHERE runtime = ?", (now, runtime)
+            )
+        run_log = self.run_logs.get(runtime)
+        if run_log and len(run_log) > line:
+            lines, next_line = run_log.read(line, len(run_log) - line)
+            connection.executemany(
+                "INSERT OR REPLACE INTO run_log VALUES (?, ?, ?)",
+                (
+                    (runtime, line + index, content)
+                    for index, content in enumerate(lines)
+                ),
+            )
+            line = next_line
+        self.published[runtime] = (state_data, line)
+
+    def synchronize(self):
+        now = time()
+        with self.lock, self.connection as connection:
+            for runtime, state in list(self.run_db.items()):
+                self.publish(connection, runtime, state, now)
+            for (runtime,) in connection.execute("SELECT runtime FROM run_stop"):
+                state = self.run_db.get(runtime)
+                if state and state["status"] == "Running":
+                    state["status"] = "stop"
+            expired = "SELECT runtime FROM run_state WHERE updated < ?"
+            for table in ("run_log", "run_stop", "run_state"):
+                connection.execute(
+                    f"DELETE FROM {table} WHERE runtime IN ({expired})",
+                    (now - self.expiry,),
+                )
+
+    def synchronizer(self):
+        while True:
+            sleep(self.sync_interval)
+            try:
+                self.synchronize()
+            except Exception as exc:
+                error(f"Run store synchronization failed ({exc})")
@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine
+from functools import partial
+from json import dumps
+from re import search
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
 
@@ -9,6 +12,7 @@ DIALECT = DATABASE_URL.split(":")[0]
 
 engine_parameters = {
     "convert_unicode": True,
+    "json_serializer": partial(dumps, default=str),
     "pool_pre_ping": True,
     "pool_recycle": 3600,
 }
@@ -22,5 +26,17 @@ if DIALECT == "mysql":
     )
 
 engine = create_engine(DATABASE_URL, **engine_parameters)
+
+if DIALECT == "sqlite":
+
+    @event.listens_for(engine, "connect")
+    def create_regexp_function(connection, _):
+        connection.create_function(
+            "regexp",
+            2,
+            lambda pattern, value: value is not None and bool(search(pattern, value)),
+        )
+
+
 Session = scoped_session(sessionmaker(autoflush=False, bind=engine))
 Base = declarative_base()
@@ -54,13 +54,13 @@ service_workflow_table = Table(
 pool_device_table = Table(
     "pool_device_association",
     Base.metadata,
-    Column("pool_id", Integer, ForeignKey("pool.id")),
+    Column("pool_id", Integer, ForeignKey("pool.id"), index=True),
     Column("device_id", Integer, ForeignKey("device.id")),
 )
 
 pool_link_table = Table(
     "pool_link_association",
     Base.metadata,
-    Column("pool_id", Integer, ForeignKey("pool.id")),
+    Column("pool_id", Integer, ForeignKey("pool.id"), index=True),
     Column("link_id", Integer, ForeignKey("link.id")),
 )
@@ -1,6 +1,16 @@
-from sqlalchemy import Column as SQLA_Column, PickleType, String, Text
+from json import dumps, loads
+from sqlalchemy import (
+    Column as SQLA_Column,
+    JSON,
+    LargeBinary,
+    PickleType,
+    String,
+    Text,
+)
 from sqlalchemy.dialects.mysql.base import MSMediumBlob
 from sqlalchemy.ext.mutable import MutableDict, MutableList
+from sqlalchemy.types import TypeDecorator
+from zlib import compress, decompress
 
 from eNMS.setup import settings
 from eNMS.database import DIALECT
@@ -11,6 +21,27 @@ class CustomPickleType(PickleType):
         impl = MSMediumBlob
 
 
+class CompressedJSONType(TypeDecorator):
+    impl = MSMediumBlob if DIALECT == "mysql" else LargeBinary
+
+    def process_bind_param(self, value, dialect):
+        if value is not None:
+            return compress(dumps(value, default=str).encode())
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            return loads(decompress(value))
+
+
+data_storage_types = {
+    "compressed": CompressedJSONType,
+    "json": JSON(none_as_null=True),
+    "pickle": CustomPickleType,
+}
+
+DataDict = MutableDict.as_mutable(
+    data_storage_types[settings["database"]["data_storage"]]
+)
 MutableDict = MutableDict.as_mutable(CustomPickleType)
 MutableList = MutableList.as_mutable(CustomPickleType)
 LargeString = Text(settings["database"]["large_string_length"])
@@ -18,6 +49,7 @@ SmallString = String(settings["database"]["small_string_length"])
 
 
 default_ctypes = {
+    DataDict: {},
     MutableDict: {},
     MutableList: [],
     LargeString: "",
@@ -4,6 +4,8 @@ from sqlalchemy.orm.collections import InstrumentedList
 from sqlalchemy.types import JSON
 
 from eNMS.database import Base
+from eNMS.database.dialect import CompressedJSONType
+from eNMS.database.functions import invalidate_fetch_cache
 from eNMS.models import model_properties, models, property_types, relationships
 from eNMS.properties import private_properties
 
@@ -20,6 +22,7 @@ def model_inspection(mapper, model):
         else:
             column_type = {
                 Boolean: "bool",
+                CompressedJSONType: "dict",
                 Integer: "int",
                 Float: "float",
                 JSON: "dict",
@@ -50,6 +53,12 @@ def model_inspection(mapper, model):
         }
 
 
+@event.listens_for(Base, "after_update", propagate=True)
+@event.listens_for(Base, "after_delete", propagate=True)
+def update_fetch_cache(mapper, connection, target):
+    invalidate_fetch_cache(target)
+
+
 def configure_events(app):
     @event.listens_for(Base, "after_insert", propagate=True)
     def log_instance_creation(mapper, connection, target):
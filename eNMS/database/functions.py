@@ -1,13 +1,88 @@
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from json import loads
+from logging import warning
+from pickle import loads as pickle_loads
 from re import search
-from sqlalchemy import func
+from sqlalchemy import bindparam, func, inspect, literal_column, select, text
+from sqlalchemy.exc import DBAPIError
+from threading import Lock
+from time import time
+from zlib import decompress
 
-from eNMS.database import Session
+from eNMS.database import Base, DIALECT, engine, Session
 from eNMS.models import models
+from eNMS.setup import settings
+
+data_columns = (
+    ("result", "result"),
+    ("run", "state"),
+    ("run", "properties"),
+    ("service", "initial_payload"),
+)
+
+fetch_cache, fetch_cache_index, fetch_cache_counters = OrderedDict(), {}, Counter()
+fetch_cache_lock = Lock()
+count_cache = {}
+
+
+@lru_cache()
+def column_properties(model):
+    return set(inspect(models[model]).columns.keys())
+
+
+def fetch_cache_key(model, kwargs):
+    if len(kwargs) != 1:
+        return
+    ((property, value),) = kwargs.items()
+    if isinstance(value, (int, str)) and property in column_properties(model):
+        return (model, property, value)
+
+
+def get_fetch_cache(cache_key):
+    with fetch_cache_lock:
+        entry = fetch_cache.get(cache_key)
+        if entry:
+            fetch_cache.move_to_end(cache_key)
+            return entry[0]
+
+
+def set_fetch_cache(cache_key, instance):
+    identity_key = inspect(instance).identity_key
+    with fetch_cache_lock:
+        fetch_cache[cache_key] = (instance.id, identity_key)
+        fetch_cache.move_to_end(cache_key)
+        fetch_cache_index.setdefault(identity_key, set()).add(cache_key)
+        while len(fetch_cache) > settings["database"]["fetch_cache_size"]:
+            key, (_, identity_key) = fetch_cache.popitem(last=False)
+            keys = fetch_cache_index.get(identity_key, set())
+            keys.discard(key)
+            if not keys:
+                fetch_cache_index.pop(identity_key, None)
+
+
+def invalidate_fetch_cache(instance):
+    with fetch_cache_lock:
+        for key in fetch_cache_index.pop(inspect(instance).identity_key, ()):
+            fetch_cache.pop(key, None)
 
 
 def fetch(model, allow_none=False, all_matches=False, **kwargs):
+    cache_key = None if all_matches else fetch_cache_key(model, kwargs)
+    instance_id = get_fetch_cache(cache_key) if cache_key else None
+    if instance_id:
+        instance = Session.query(models[model]).get(instance_id)
+        if instance and getattr(instance, cache_key[1]) == cache_key[2]:
+            fetch_cache_counters["hit"] += 1
+            return instance
+        with fetch_cache_lock:
+            fetch_cache.pop(cache_key, None)
     query = Session.query(models[model]).filter_by(**kwargs)
     result = query.all() if all_matches else query.first()
+    if cache_key:
+        fetch_cache_counters["miss"] += 1
+        if result:
+            set_fetch_cache(cache_key, result)
     if result or allow_none:
         return result
     else:
@@ -30,8 +105,140 @@ def get_query_count(query):
     return query.session.execute(count_query).scalar()
 
 
+def cached_count(key, counter):
+    count_time, value = count_cache.get(key, (0, None))
+    if time() - count_time >= settings["database"]["count_cache_ttl"]:
+        if len(count_cache) >= settings["database"]["fetch_cache_size"]:
+            count_cache.clear()
+        value = counter()
+        count_cache[key] = (time(), value)
+    return value
+
+
+def get_cached_query_count(query):
+    count_query = query.statement.with_only_columns([func.count()]).order_by(None)
+    compiled = count_query.compile(dialect=engine.dialect)
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    return cached_count(key, lambda: query.session.execute(count_query).scalar())
+
+
+def estimate_table_count(table):
+    if DIALECT == "postgresql":
+        query = "SELECT reltuples::bigint FROM pg_class WHERE relname = :table"
+    elif DIALECT == "mysql":
+        query = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = :table"
+        )
+    else:
+        return None
+    return Session.execute(text(query), {"table": table}).scalar()
+
+
+def get_table_count(model):
+    def counter():
+        threshold = settings["database"]["approximate_count_threshold"]
+        if threshold:
+            estimate = estimate_table_count(models[model].__tablename__)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        return Session.query(func.count(models[model].id)).scalar()
+
+    return cached_count(model, counter)
+
+
+def create_missing_indexes():
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+
+
+search_properties = (("device", "configuration"), ("device", "operational_data"))
+
+sqlite_search_index = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS device_search USING fts5(configuration, "
+    "operational_data, content='device', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS device_search_insert AFTER INSERT ON device BEGIN "
+    "INSERT INTO device_search(rowid, configuration, operational_data) "
+    "VALUES (new.id, new.configuration, new.operational_data); END",
+    "CREATE TRIGGER IF NOT EXISTS device_search_delete AFTER DELETE ON device BEGIN "
+    "INSERT INTO device_search(device_search, rowid, configuration, operational_data) "
+    "VALUES ('delete', old.id, old.configuration, old.operational_data); END",
+    "CREATE TRIGGER IF NOT EXISTS device_search_update AFTER UPDATE OF configuration, "
+    "operational_data ON device BEGIN "
+    "INSERT INTO device_search(device_search, rowid, configuration, operational_data) "
+    "VALUES ('delete', old.id, old.configuration, old.operational_data); "
+    "INSERT INTO device_search(rowid, configuration, operational_data) "
+    "VALUES (new.id, new.configuration, new.operational_data); END",
+    "INSERT INTO device_search(device_search) VALUES ('rebuild')",
+)
+
+
+def create_search_index():
+    try:
+        with engine.begin() as connection:
+            if DIALECT == "sqlite":
+                triggers = connection.execute(
+                    text(
+                        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+                        "AND name LIKE 'device_search_%'"
+                    )
+                ).scalar()
+                if triggers < 3:
+                    connection.execute(text("DROP TABLE IF EXISTS device_search"))
+                    for statement in sqlite_search_index:
+                        connection.execute(text(statement))
+            elif DIALECT == "postgresql":
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for _, property in search_properties:
+                    connection.execute(
+                        text(
+                            f"CREATE INDEX IF NOT EXISTS ix_device_{property}_trigram "
+                            f"ON device USING gin ({property} gin_trgm_ops)"
+                        )
+                    )
+    except DBAPIError as exc:
+        warning(f"Configuration search index unavailable ({exc})")
+        return False
+    return DIALECT == "sqlite"
+
+
+def search_index_query(property, value):
+    return (
+        select([literal_column("rowid")])
+        .select_from(text("device_search"))
+        .where(literal_column(property).contains(value))
+    )
+
+
+def bulk_fetch(model, values, property="id", chunk_size=900):
+    values, matches = list(values), {}
+    unique_values = list(dict.fromkeys(values))
+    column = getattr(models[model], property)
+    for start in range(0, len(unique_values), chunk_size):
+        end = start + chunk_size
+        query = Session.query(models[model]).filter(
+            column.in_(unique_values[start:end])
+        )
+        for instance in query.all():
+            matches.setdefault(str(getattr(instance, property)), instance)
+    instances = [matches[str(value)] for value in values if str(value) in matches]
+    return instances, [value for value in unique_values if str(value) not in matches]
+
+
 def objectify(model, object_list):
-    return [fetch(model, id=object_id) for object_id in object_list]
+    instances, not_found = bulk_fetch(model, object_list)
+    if not_found:
+        raise Exception(
+            f"There is no {model} in the database "
+            f"with the following IDs: {', '.join(map(str, not_found))}"
+        )
+    return instances
 
 
 def delete(model, allow_none=False, **kwargs):
@@ -70,6 +277,57 @@ def factory(cls_name, **kwargs):
     return instance
 
 
+def decode_data(value):
+    if value is None or isinstance(value, dict):
+        return value
+    elif isinstance(value, str):
+        return loads(value)
+    value = bytes(value)
+    for decoder in (pickle_loads, lambda value: loads(decompress(value)), loads):
+        try:
+            return decoder(value)
+        except Exception:
+            continue
+    raise ValueError("Unknown data storage format")
+
+
+def convert_data_storage(batch_size=1000):
+    for table_name, property in data_columns:
+        column_type = models[table_name].__table__.c[property].type
+        new_type = column_type.compile(dialect=engine.dialect)
+        current_type = {
+            column["name"]: column["type"].compile(dialect=engine.dialect)
+            for column in inspect(engine).get_columns(table_name)
+        }[property]
+        rebuild = DIALECT != "sqlite" and new_type.upper() != current_type.upper()
+        target = f"{property}_converted" if rebuild else property
+        if rebuild:
+            Session.execute(f"ALTER TABLE {table_name} ADD {target} {new_type}")
+        update = text(
+            f"UPDATE {table_name} SET {target} = :value WHERE id = :row_id"
+        ).bindparams(bindparam("value", type_=column_type))
+        last_id = 0
+        while True:
+            rows = Session.execute(
+                f"SELECT id, {property} FROM {table_name} WHERE id > :last_id "
+                f"ORDER BY id LIMIT {batch_size}",
+                {"last_id": last_id},
+            ).fetchall()
+            if not rows:
+                break
+            Session.execute(
+                update,
+                [{"row_id": id, "value": decode_data(value)} for id, value in rows],
+            )
+            last_id = rows[-1][0]
+        if rebuild:
+            Session.execute(f"ALTER TABLE {table_name} DROP COLUMN {property}")
+            Session.execute(
+                f"ALTER TABLE {table_name} RENAME COLUMN {target} TO {property}"
+            )
+        Session.commit()
+
+
 def handle_exception(exc):
     match = search("UNIQUE constraint failed: (\w+).(\w+)", exc)
     if match:
@@ -1,4 +1,3 @@
-from ast import parse
 from wtforms import (
     BooleanField,
     FloatField,
@@ -75,6 +74,14 @@ class ServiceForm(BaseForm):
     )
     result_postprocessing = CodeField(widget=TextArea(), render_kw={"rows": 8})
     multiprocessing = BooleanField("Multiprocessing")
+    multiprocessing_method = SelectField(
+        "Multiprocessing Method",
+        choices=(
+            ("thread", "Thread Pool"),
+            ("asyncio", "Asyncio Event Loop"),
+            ("process", "Process Pool"),
+        ),
+    )
     max_processes = IntegerField("Maximum number of processes", default=15)
     conversion_method = SelectField(
         choices=(
@@ -111,8 +118,10 @@ class ServiceForm(BaseForm):
         "device_query",
         "skip_query",
         "iteration_values",
+        "iteration_devices",
         "result_postprocessing",
     ]
+    exec_fields = ["result_postprocessing"]
 
     def validate(self):
         valid_form = super().validate()
@@ -128,8 +137,11 @@ class ServiceForm(BaseForm):
         bracket_error = False
         for query_field in self.query_fields:
             field = getattr(self, query_field)
+            mode = "exec" if query_field in self.exec_fields else "eval"
             try:
-                parse(field.data)
+                if field.data:
+                    source = field.data.lstrip(" \t") if mode == "eval" else field.data
+                    compile(source, query_field, mode)
             except Exception as exc:
                 bracket_error = True
                 field.errors.append(f"Wrong python expression ({exc}).")
@@ -174,6 +186,7 @@ class ConnectionForm(ServiceForm):
     custom_password = PasswordSubstitutionField("Custom Password")
     start_new_connection = BooleanField("Start New Connection")
     close_connection = BooleanField("Close Connection")
+    persistent_connection = BooleanField("Persistent Connection (reused across runs)")
     group = {
         "commands": [
             "credentials",
@@ -181,6 +194,7 @@ class ConnectionForm(ServiceForm):
             "custom_password",
             "start_new_connection",
             "close_connection",
+            "persistent_connection",
         ],
         "default": "expanded",
     }
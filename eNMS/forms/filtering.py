@@ -46,6 +46,7 @@ def filtering_form_generator():
                         choices=(
                             ("inclusion", "Inclusion"),
                             ("equality", "Equality"),
+                            ("prefix", "Prefix"),
                             ("regex", "Regular Expression"),
                         )
                     )
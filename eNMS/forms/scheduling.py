@@ -46,6 +46,7 @@ class TaskForm(BaseForm):
         ),
     )
     crontab_expression = StringField("Crontab Expression")
+    jitter = IntegerField("Jitter (random delay in seconds)", default=0)
     initial_payload = DictField("Payload")
 
     def validate(self):
@@ -1,9 +1,14 @@
 from click import argument, echo, option
 from json import loads
+from multiprocessing import get_context
 
 from eNMS import app
 from eNMS.database import Session
-from eNMS.database.functions import delete, factory, fetch
+from eNMS.database.functions import convert_data_storage, delete, factory, fetch
+
+
+def start_runner(threads):
+    app.start_runner(threads)
 
 
 def configure_cli(flask_app):
@@ -33,6 +38,12 @@ def configure_cli(flask_app):
         Session.commit()
         echo(app.str_dict(device))
 
+    @flask_app.cli.command(name="convert_data_storage")
+    def cli_convert_data_storage():
+        convert_data_storage()
+        storage = app.settings["database"]["data_storage"]
+        echo(f"Results, runs and payloads converted to '{storage}' storage.")
+
     @flask_app.cli.command(name="run_service")
     @argument("name")
     @option("--devices")
@@ -46,3 +57,21 @@ def configure_cli(flask_app):
         results = app.run(service.id, **payload_dict)
         Session.commit()
         echo(app.str_dict(results))
+
+    @flask_app.cli.command(name="start_runners")
+    @option("--processes", default=1)
+    @option("--threads", default=10)
+    def start_runners(processes, threads):
+        app.scheduler.shutdown(wait=False)
+        context = get_context("spawn")
+        runners = [
+            context.Process(
+                target=start_runner, args=(threads,), name=f"Runner-{index}"
+            )
+            for index in range(processes)
+        ]
+        for runner in runners:
+            runner.start()
+        echo(f"{processes} runner(s) started with {threads} threads each.")
+        for runner in runners:
+            runner.join()
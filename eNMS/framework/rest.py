@@ -1,4 +1,3 @@
-from datetime import datetime
 from flask import request
 from flask_restful import abort, Api, Resource
 from functools import wraps
@@ -7,7 +6,14 @@ from uuid import getnode
 
 from eNMS import app
 from eNMS.database import Session
-from eNMS.database.functions import delete, factory, fetch
+from eNMS.database.functions import (
+    bulk_fetch,
+    delete,
+    factory,
+    fetch,
+    fetch_cache,
+    fetch_cache_counters,
+)
 from eNMS.framework.extensions import auth, csrf
 
 
@@ -43,20 +49,13 @@ class CreatePool(Resource):
     decorators = [auth.login_required, catch_exceptions]
 
     def post(self):
-        data = request.get_json(force=True)
-        factory(
-            "pool",
-            **{
-                "name": data["name"],
-                "devices": [
-                    fetch("device", name=name).id for name in data.get("devices", "")
-                ],
-                "links": [
-                    fetch("link", name=name).id for name in data.get("links", "")
-                ],
-                "never_update": True,
-            },
-        )
+        data, objects = request.get_json(force=True), {}
+        for model in ("device", "link"):
+            instances, not_found = bulk_fetch(model, data.get(f"{model}s", ""), "name")
+            if not_found:
+                raise Exception(f"No {model} with the names: {', '.join(not_found)}")
+            objects[f"{model}s"] = [instance.id for instance in instances]
+        factory("pool", **{"name": data["name"], "never_update": True, **objects})
         Session.commit()
         return data
 
@@ -66,6 +65,9 @@ class Heartbeat(Resource):
         return {
             "name": getnode(),
             "cluster_id": app.settings["cluster"]["id"],
+            "fetch_cache": {**fetch_cache_counters, "size": len(fetch_cache)},
+            "connections": app.connections_cache.status,
+            "scheduler": app.scheduler_executor.status,
         }
 
 
@@ -143,24 +145,16 @@ class RunService(Resource):
             devices, pools = [], []
             service = fetch("service", name=data["name"])
             handle_asynchronously = data.get("async", False)
-            for device_name in data.get("devices", ""):
-                device = fetch("device", name=device_name)
-                if device:
-                    devices.append(device.id)
-                else:
-                    errors.append(f"No device with the name '{device_name}'")
-            for device_ip in data.get("ip_addresses", ""):
-                device = fetch("device", ip_address=device_ip)
-                if device:
-                    devices.append(device.id)
-                else:
-                    errors.append(f"No device with the IP address '{device_ip}'")
-            for pool_name in data.get("pools", ""):
-                pool = fetch("pool", name=pool_name)
-                if pool:
-                    pools.append(pool.id)
-                else:
-                    errors.append(f"No pool with the name '{pool_name}'")
+            for key, model, property, label, targets in (
+                ("devices", "device", "name", "name", devices),
+                ("ip_addresses", "device", "ip_address", "IP address", devices),
+                ("pools", "pool", "name", "name", pools),
+            ):
+                instances, not_found = bulk_fetch(model, data.get(key, ""), property)
+                targets.extend(instance.id for instance in instances)
+                errors.extend(
+                    f"No {model} with the {label} '{value}'" for value in not_found
+                )
             if errors:
                 return {"errors": errors}
         except Exception as exc:
@@ -170,14 +164,7 @@ class RunService(Resource):
             data.update({"devices": devices, "pools": pools})
         data["runtime"] = runtime = app.get_time()
         if handle_asynchronously:
-            app.scheduler.add_job(
-                id=runtime,
-                func=app.run,
-                run_date=datetime.now(),
-                args=[service.id],
-                kwargs=data,
-                trigger="date",
-            )
+            app.submit_run(service.id, **data)
             return {"errors": errors, "runtime": runtime}
         else:
             return {**app.run(service.id, **data), "errors": errors}
@@ -150,6 +150,18 @@ def download_output(id):
     )
 
 
+@blueprint.route("/run_events")
+@monitor_requests
+def run_events():
+    runtimes = request.args.getlist("runtime")
+    lines = request.args.getlist("line", type=int)
+    return Response(
+        app.run_events("runs" in request.args, dict(zip(runtimes, lines))),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @blueprint.route("/download_file/<path:path>")
 @monitor_requests
 def download_file(path):
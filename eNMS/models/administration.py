@@ -49,7 +49,7 @@ class Changelog(AbstractBase):
     type = Column(SmallString)
     __mapper_args__ = {"polymorphic_identity": "changelog", "polymorphic_on": type}
     id = Column(Integer, primary_key=True)
-    time = Column(SmallString)
+    time = Column(SmallString, index=True)
     content = Column(LargeString, default="")
     severity = Column(SmallString, default="debug")
     user = Column(SmallString, default="admin")
@@ -1,11 +1,16 @@
+from asyncio import gather, get_event_loop, new_event_loop, Semaphore, set_event_loop
+from asyncio import sleep as async_sleep
 from builtins import __dict__ as builtins
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime
-from functools import partial
+from functools import lru_cache, partial
 from io import BytesIO
+from itertools import cycle
 from json import dumps, loads
 from json.decoder import JSONDecodeError
+from multiprocessing import get_context
 from multiprocessing.pool import ThreadPool
 from napalm import get_network_driver
 from netmiko import ConnectHandler
@@ -19,7 +24,6 @@ from slackclient import SlackClient
 from sqlalchemy import Boolean, ForeignKey, Integer
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
-from threading import currentThread, enumerate, Thread
 from time import sleep
 from traceback import format_exc
 from xmltodict import parse
@@ -29,6 +33,7 @@ from eNMS import app
 from eNMS.database import Session
 from eNMS.database.dialect import (
     Column,
+    DataDict,
     LargeString,
     MutableDict,
     MutableList,
@@ -42,7 +47,7 @@ from eNMS.database.associations import (
     service_workflow_table,
 )
 from eNMS.database.base import AbstractBase
-from eNMS.database.functions import factory, fetch
+from eNMS.database.functions import bulk_fetch, factory, fetch
 from eNMS.models import models
 from eNMS.models.inventory import Device  # noqa: F401
 from eNMS.models.scheduling import Task  # noqa: F401
@@ -87,7 +92,7 @@ class Service(AbstractBase):
     include_device_results = Column(Boolean, default=True)
     include_link_in_summary = Column(Boolean, default=True)
     mail_recipient = Column(SmallString)
-    initial_payload = Column(MutableDict)
+    initial_payload = Column(DataDict)
     skip = Column(Boolean, default=False)
     skip_query = Column(LargeString)
     skip_value = Column(SmallString, default="True")
@@ -99,6 +104,7 @@ class Service(AbstractBase):
     runs = relationship("Run", back_populates="service", cascade="all, delete-orphan")
     maximum_runs = Column(Integer, default=1)
     multiprocessing = Column(Boolean, default=False)
+    multiprocessing_method = Column(SmallString, default="thread")
     max_processes = Column(Integer, default=5)
     conversion_method = Column(SmallString, default="none")
     validation_method = Column(SmallString, default="none")
@@ -164,6 +170,7 @@ class ConnectionService(Service):
     custom_password = Column(SmallString)
     start_new_connection = Column(Boolean, default=False)
     close_connection = Column(Boolean, default=False)
+    persistent_connection = Column(Boolean, default=False)
     __mapper_args__ = {"polymorphic_identity": "connection_service"}
 
 
@@ -176,17 +183,17 @@ class Result(AbstractBase):
     success = Column(Boolean, default=False)
     runtime = Column(SmallString)
     duration = Column(SmallString)
-    result = Column(MutableDict)
+    result = Column(DataDict)
     run_id = Column(Integer, ForeignKey("run.id"))
     run = relationship("Run", back_populates="results", foreign_keys="Result.run_id")
-    parent_runtime = Column(SmallString)
+    parent_runtime = Column(SmallString, index=True)
     parent_device_id = Column(Integer, ForeignKey("device.id"))
     parent_device = relationship("Device", uselist=False, foreign_keys=parent_device_id)
     parent_device_name = association_proxy("parent_device", "name")
-    device_id = Column(Integer, ForeignKey("device.id"))
+    device_id = Column(Integer, ForeignKey("device.id"), index=True)
     device = relationship("Device", uselist=False, foreign_keys=device_id)
     device_name = association_proxy("device", "name")
-    service_id = Column(Integer, ForeignKey("service.id"))
+    service_id = Column(Integer, ForeignKey("service.id"), index=True)
     service = relationship("Service", foreign_keys="Result.service_id")
     service_name = association_proxy(
         "service", "scoped_name", info={"name": "service_name"}
@@ -196,6 +203,7 @@ class Result(AbstractBase):
     workflow_name = association_proxy(
         "workflow", "scoped_name", info={"name": "workflow_name"}
     )
+    eager_load = ["device", "parent_device", "service", "workflow"]
 
     def __getitem__(self, key):
         return self.result[key]
@@ -218,17 +226,17 @@ class Run(AbstractBase):
     restart_run = relationship("Run", uselist=False, foreign_keys=restart_run_id)
     start_services = Column(MutableList)
     creator = Column(SmallString, default="admin")
-    properties = Column(MutableDict)
+    properties = Column(DataDict)
     success = Column(Boolean, default=False)
     status = Column(SmallString, default="Running")
-    runtime = Column(SmallString)
+    runtime = Column(SmallString, index=True)
     duration = Column(SmallString)
     parent_id = Column(Integer, ForeignKey("run.id"))
     parent = relationship(
         "Run", remote_side=[id], foreign_keys="Run.parent_id", back_populates="children"
     )
     children = relationship("Run", foreign_keys="Run.parent_id")
-    parent_runtime = Column(SmallString)
+    parent_runtime = Column(SmallString, index=True)
     path = Column(SmallString)
     parent_device_id = Column(Integer, ForeignKey("device.id"))
     parent_device = relationship("Device", foreign_keys="Run.parent_device_id")
@@ -248,9 +256,11 @@ class Run(AbstractBase):
     )
     task_id = Column(Integer, ForeignKey("task.id", ondelete="SET NULL"))
     task = relationship("Task", foreign_keys="Run.task_id")
-    state = Column(MutableDict, info={"dont_track_changes": True})
+    state = Column(DataDict, info={"dont_track_changes": True})
     results = relationship("Result", back_populates="run", cascade="all, delete-orphan")
     model_properties = ["progress", "service_properties"]
+    eager_load = ["service", "workflow"]
+    substitution_regex = compile("{{(.*?)}}")
 
     def __init__(self, **kwargs):
         self.runtime = kwargs.get("runtime") or app.get_time()
@@ -315,6 +325,15 @@ class Run(AbstractBase):
         else:
             return app.run_db[self.parent_runtime]["services"][self.path]
 
+    @property
+    def shared_state(self):
+        if self.state or self.parent_runtime in app.run_db:
+            return self.run_state
+        state = app.run_store.get_state(self.parent_runtime) or {}
+        if self.runtime == self.parent_runtime:
+            return state
+        return state.get("services", {}).get(self.path, {})
+
     @property
     def edge_state(self):
         return app.run_db[self.parent_runtime]["edges"]
@@ -325,8 +344,9 @@ class Run(AbstractBase):
 
     @property
     def progress(self):
-        if self.status == "Running" and self.run_state.get("progress"):
-            progress = self.run_state["progress"]["device"]
+        state = self.shared_state if self.status == "Running" else {}
+        if state.get("progress"):
+            progress = state["progress"]["device"]
             try:
                 return (
                     f"{progress['success'] + progress['failure']}/{progress['total']}"
@@ -339,18 +359,12 @@ class Run(AbstractBase):
 
     def compute_devices_from_query(_self, query, property, **locals):  # noqa: N805
         values = _self.eval(query, **locals)[0]
-        devices, not_found = set(), []
         if isinstance(values, str):
             values = [values]
-        for value in values:
-            device = fetch("device", allow_none=True, **{property: value})
-            if device:
-                devices.add(device)
-            else:
-                not_found.append(value)
+        devices, not_found = bulk_fetch("device", values, property)
         if not_found:
             raise Exception(f"Device query invalid targets: {', '.join(not_found)}")
-        return devices
+        return set(devices)
 
     def compute_devices(self, payload):
         devices = set(self.devices)
@@ -404,7 +418,7 @@ class Run(AbstractBase):
         self.run_state["status"] = "Running"
         start = datetime.now().replace(microsecond=0)
         try:
-            app.service_db[self.service.id]["runs"] += 1
+            app.run_store.update_runs(self.service.id, 1)
             self.service.status = "Running"
             Session.commit()
             results = self.device_run(payload)
@@ -418,7 +432,11 @@ class Run(AbstractBase):
             self.log("error", result)
             results = {"success": False, "runtime": self.runtime, "result": result}
         finally:
-            Session.commit()
+            try:
+                app.flush_results(self.id)
+            except Exception:
+                Session.rollback()
+                self.log("error", f"Failed to store results:\n{format_exc()}")
             results["summary"] = self.run_state.get("summary", None)
             self.status = "Aborted" if self.stop else "Completed"
             self.run_state["status"] = self.status
@@ -426,16 +444,15 @@ class Run(AbstractBase):
                 self.success = self.run_state["success"] = results["success"]
             if self.send_notification:
                 results = self.notify(results)
-            app.service_db[self.service.id]["runs"] -= 1
-            if not app.service_db[self.id]["runs"]:
+            if not app.run_store.update_runs(self.service.id, -1):
                 self.service.status = "Idle"
             results["duration"] = self.duration = str(
                 datetime.now().replace(microsecond=0) - start
             )
-            results["logs"] = app.run_logs.pop(self.runtime, [])
+            results["logs"] = app.pop_run_logs(self.runtime)
             if self.runtime == self.parent_runtime:
-                self.state = results["state"] = app.run_db.pop(self.runtime)
-                # self.close_remaining_connections()
+                self.state = results["state"] = app.pop_run_state(self.runtime)
+                self.close_remaining_connections()
             if self.task and not self.task.frequency:
                 self.task.is_active = False
             results["properties"] = {
@@ -448,6 +465,7 @@ class Run(AbstractBase):
                 or self.run_method == "once"
             ):
                 self.create_result(results)
+            app.flush_results(self.id)
             Session.commit()
         return results
 
@@ -457,6 +475,35 @@ class Run(AbstractBase):
         device = fetch("device", id=device_id)
         run = fetch("run", runtime=runtime)
         results.append(run.get_results(payload, device))
+        if Session.new or Session.dirty or Session.deleted:
+            Session.commit()
+
+    @staticmethod
+    def get_process_result(args):
+        device_id, runtime, payload = args
+        device = fetch("device", id=device_id)
+        run = fetch("run", runtime=runtime)
+        app.run_db.clear()
+        if run.runtime != run.parent_runtime:
+            app.run_db[run.parent_runtime] = {
+                "services": defaultdict(dict),
+                "edges": defaultdict(int),
+            }
+        run.init_state()
+        run.run_state["status"] = "Running"
+        results = run.get_results(payload, device)
+        state, logs = run.run_state, app.pop_run_logs(run.parent_runtime)
+        result_rows = app.result_buffer.pop(run.id, {"results": []})["results"]
+        if Session.new or Session.dirty or Session.deleted:
+            Session.commit()
+        Session.remove()
+        return (
+            results,
+            result_rows,
+            logs,
+            state["progress"]["device"],
+            state["summary"],
+        )
 
     def device_iteration(self, payload, device):
         derived_devices = self.compute_devices_from_query(
@@ -501,16 +548,8 @@ class Run(AbstractBase):
         else:
 
             if self.multiprocessing and len(self.devices) > 1:
-                results = []
-                processes = min(len(self.devices), self.max_processes)
-                process_args = [
-                    (device.id, self.runtime, payload, results)
-                    for device in self.devices
-                ]
-                pool = ThreadPool(processes=processes)
-                pool.map(self.get_device_result, process_args)
-                pool.close()
-                pool.join()
+                method = self.multiprocessing_method
+                results = getattr(self, f"{method}_device_run")(payload)
             else:
                 results = [self.get_results(payload, device) for device in self.devices]
             return {
@@ -518,24 +557,140 @@ class Run(AbstractBase):
                 "runtime": self.runtime,
             }
 
+    def thread_device_run(self, payload):
+        results = []
+        processes = min(len(self.devices), self.max_processes)
+        process_args = [
+            (device.id, self.runtime, payload, results) for device in self.devices
+        ]
+        pool = ThreadPool(processes=processes)
+        pool.map(self.get_device_result, process_args)
+        pool.close()
+        pool.join()
+        return results
+
+    def process_device_run(self, payload):
+        Session.commit()
+        results, state = [], self.run_state
+        processes = min(len(self.devices), self.max_processes)
+        process_args = [(device.id, self.runtime, payload) for device in self.devices]
+        with get_context("spawn").Pool(processes) as pool:
+            for process_results in pool.imap_unordered(
+                self.get_process_result, process_args
+            ):
+                device_results, result_rows, logs, progress, summary = process_results
+                results.append(device_results)
+                for result in result_rows:
+                    app.buffer_result(self.id, result)
+                app.run_logs[self.parent_runtime].extend(logs)
+                for key, value in progress.items():
+                    state["progress"]["device"][key] += value
+                for key, devices in summary.items():
+                    state["summary"][key].extend(devices)
+        return results
+
+    def asyncio_device_run(self, payload):
+        loop = new_event_loop()
+        set_event_loop(loop)
+        try:
+            return loop.run_until_complete(self.async_device_run(payload))
+        finally:
+            loop.close()
+            set_event_loop(None)
+
+    async def async_device_run(self, payload):
+        semaphore = Semaphore(self.max_processes)
+        if hasattr(self.service, "async_job"):
+
+            async def device_results(device):
+                async with semaphore:
+                    return await self.async_get_results(payload, device)
+
+            return await gather(*(device_results(device) for device in self.devices))
+        else:
+            results, loop = [], get_event_loop()
+            processes = min(len(self.devices), self.max_processes)
+            with ThreadPoolExecutor(max_workers=processes) as executor:
+                await gather(
+                    *(
+                        loop.run_in_executor(
+                            executor,
+                            self.get_device_result,
+                            (device.id, self.runtime, payload, results),
+                        )
+                        for device in self.devices
+                    )
+                )
+            return results
+
     def create_result(self, results, device=None):
-        self.success = results["success"]
+        if not device:
+            self.success = results["success"]
         result_kw = {
-            "run": self,
-            "result": results,
-            "service": self.service_id,
+            "run_id": self.id,
+            "result": dict(results),
+            "success": results["success"],
+            "runtime": results["runtime"],
+            "duration": results["duration"],
+            "service_id": self.service_id,
             "parent_runtime": self.parent_runtime,
+            "workflow_id": self.workflow_id,
+            "parent_device_id": self.parent_device_id,
+            "device_id": device.id if device else None,
         }
-        if self.workflow_id:
-            result_kw["workflow"] = self.workflow_id
-        if self.parent_device_id:
-            result_kw["parent_device"] = self.parent_device_id
-        if device:
-            result_kw["device"] = device.id
-        factory("result", **result_kw)
+        app.buffer_result(self.id, result_kw)
 
-    def run_service_job(self, payload, device):
+    def release_device_connection(self, device, discard=False):
+        if not device:
+            return
+        if (
+            discard
+            or getattr(self, "close_connection", False)
+            or self.runtime == self.parent_runtime
+        ):
+            self.close_device_connection(device.name, discard)
+        else:
+            app.connections_cache.release(self.parent_runtime, device.name)
+
+    def postprocess_results(self, results, payload, device, retries):
+        self.convert_result(results)
+        if "success" not in results:
+            results["success"] = True
+        try:
+            _, exec_variables = self.eval(
+                self.service.result_postprocessing, function="exec", **locals()
+            )
+            if isinstance(exec_variables.get("retries"), int):
+                retries = exec_variables["retries"]
+        except SystemExit:
+            pass
+        if results["success"] and self.validation_method != "none":
+            self.validate_result(results, payload, device)
+        return retries
+
+    @staticmethod
+    def run_blocking(coroutine):
+        try:
+            coroutine.send(None)
+        except StopIteration as exc:
+            return exc.value
+        coroutine.close()
+        raise RuntimeError("Blocking run awaited an asynchronous operation")
+
+    async def service_job(self, payload, device, blocking):
+        if not blocking:
+            return await self.service.async_job(self, payload, device)
         args = (device,) if device else ()
+        return self.service.job(self, payload, *args)
+
+    @staticmethod
+    async def pause(seconds, blocking):
+        if blocking:
+            sleep(seconds)
+        else:
+            await async_sleep(seconds)
+
+    async def async_run_service_job(self, payload, device, blocking=False):
         retries, total_retries = self.number_of_retries + 1, 0
         while retries > 0 and total_retries < 1000:
             retries -= 1
@@ -544,71 +699,82 @@ class Run(AbstractBase):
                 if retries:
                     retry = self.number_of_retries - retries + 2
                     self.log("error", f"RETRY n°{retry}", device)
-                results = self.service.job(self, payload, *args)
-                if device and (
-                    getattr(self, "close_connection", False)
-                    or self.runtime == self.parent_runtime
-                ):
-                    self.close_device_connection(device.name)
-                self.convert_result(results)
-                if "success" not in results:
-                    results["success"] = True
+                results = None
                 try:
-                    _, exec_variables = self.eval(
-                        self.service.result_postprocessing, function="exec", **locals()
-                    )
-                    if isinstance(exec_variables.get("retries"), int):
-                        retries = exec_variables["retries"]
-                except SystemExit:
-                    pass
-                if results["success"] and self.validation_method != "none":
-                    self.validate_result(results, payload, device)
+                    results = await self.service_job(payload, device, blocking)
+                finally:
+                    self.release_device_connection(device, results is None)
+                retries = self.postprocess_results(results, payload, device, retries)
                 if results["success"]:
                     return results
                 elif retries:
-                    sleep(self.time_between_retries)
+                    await self.pause(self.time_between_retries, blocking)
             except Exception as exc:
                 self.log("error", str(exc), device)
                 result = chr(10).join(format_exc().splitlines())
                 return {"success": False, "result": result}
         return results
 
-    def get_results(self, payload, device=None):
-        self.log("info", "STARTING", device)
-        start = datetime.now().replace(microsecond=0)
+    def skip_results(self, payload, device):
         skip_service = False
         if self.skip_query:
             skip_service = self.eval(self.skip_query, **locals())[0]
-        if skip_service or self.skip:
-            if device:
-                self.run_state["progress"]["device"]["skipped"] += 1
-                key = "success" if self.skip_value == "True" else "failure"
-                self.run_state["summary"][key].append(device.name)
-            return {
-                "result": "skipped",
-                "success": self.skip_value == "True",
-            }
+        if not skip_service and not self.skip:
+            return
+        if device:
+            self.run_state["progress"]["device"]["skipped"] += 1
+            key = "success" if self.skip_value == "True" else "failure"
+            self.run_state["summary"][key].append(device.name)
+        return {"result": "skipped", "success": self.skip_value == "True"}
+
+    def restart_payload(self, payload, device):
+        if not self.restart_run or self.service.type != "workflow":
+            return
+        old_result = self.restart_run.result(device=device.name if device else None)
+        if old_result and "payload" in old_result.result:
+            with app.payload_locks[self.parent_runtime]:
+                payload.update(old_result["payload"])
+
+    def iteration_targets(self, payload, device):
+        targets = self.eval(self.service.iteration_values, **locals())[0]
+        if not isinstance(targets, dict):
+            targets = dict(zip(map(str, targets), targets))
+        for target_name, target_value in targets.items():
+            self.payload_helper(
+                payload,
+                self.iteration_variable_name,
+                target_value,
+                device=getattr(device, "name", None),
+            )
+            yield target_name
+
+    def store_results(self, results, device, start):
+        results["duration"] = str(datetime.now().replace(microsecond=0) - start)
+        if device:
+            status = "success" if results["success"] else "failure"
+            self.run_state["progress"]["device"][status] += 1
+            self.run_state["summary"][status].append(device.name)
+            self.create_result(results, device)
+        self.log("info", "FINISHED", device)
+
+    def get_results(self, payload, device=None):
+        return self.run_blocking(self.async_get_results(payload, device, True))
+
+    async def async_get_results(self, payload, device=None, blocking=False):
+        self.log("info", "STARTING", device)
+        start = datetime.now().replace(microsecond=0)
+        skip_results = self.skip_results(payload, device)
+        if skip_results:
+            return skip_results
         results = {"runtime": app.get_time(), "logs": []}
         try:
-            if self.restart_run and self.service.type == "workflow":
-                old_result = self.restart_run.result(
-                    device=device.name if device else None
-                )
-                if old_result and "payload" in old_result.result:
-                    payload.update(old_result["payload"])
+            self.restart_payload(payload, device)
             if self.service.iteration_values:
                 targets_results = {}
-                targets = self.eval(self.service.iteration_values, **locals())[0]
-                if not isinstance(targets, dict):
-                    targets = dict(zip(map(str, targets), targets))
-                for target_name, target_value in targets.items():
-                    self.payload_helper(
-                        payload,
-                        self.iteration_variable_name,
-                        target_value,
-                        device=getattr(device, "name", None),
+                for target in self.iteration_targets(payload, device):
+                    targets_results[target] = await self.async_run_service_job(
+                        payload, device, blocking
                     )
-                    targets_results[target_name] = self.run_service_job(payload, device)
                 results.update(
                     {
                         "result": targets_results,
@@ -616,23 +782,18 @@ class Run(AbstractBase):
                     }
                 )
             else:
-                results.update(self.run_service_job(payload, device))
+                results.update(
+                    await self.async_run_service_job(payload, device, blocking)
+                )
         except Exception:
             results.update(
                 {"success": False, "result": chr(10).join(format_exc().splitlines())}
             )
             self.log("error", chr(10).join(format_exc().splitlines()), device)
-        results["duration"] = str(datetime.now().replace(microsecond=0) - start)
-        if device:
-            status = "success" if results["success"] else "failure"
-            self.run_state["progress"]["device"][status] += 1
-            self.run_state["summary"][status].append(device.name)
-            self.create_result(results, device)
-        Session.commit()
-        self.log("info", "FINISHED", device)
+        self.store_results(results, device, start)
         if self.waiting_time:
             self.log("info", f"SLEEP {self.waiting_time} seconds...", device)
-            sleep(self.waiting_time)
+            await self.pause(self.waiting_time, blocking)
         return results
 
     def log(self, severity, content, device=None):
@@ -802,21 +963,22 @@ class Run(AbstractBase):
         operation="set",
         allow_none=False,
     ):
-        payload = payload.setdefault("variables", {})
-        if device:
-            payload = payload.setdefault("devices", {})
-            payload = payload.setdefault(device, {})
-        if section:
-            payload = payload.setdefault(section, {})
-        if value is not None:
-            if operation == "set":
-                payload[name] = value
+        with app.payload_locks[self.parent_runtime]:
+            payload = payload.setdefault("variables", {})
+            if device:
+                payload = payload.setdefault("devices", {})
+                payload = payload.setdefault(device, {})
+            if section:
+                payload = payload.setdefault(section, {})
+            if value is not None:
+                if operation == "set":
+                    payload[name] = value
+                else:
+                    getattr(payload[name], operation)(value)
             else:
-                getattr(payload[name], operation)(value)
-        else:
-            if name not in payload and not allow_none:
-                raise Exception(f"Payload Editor: {name} not found in {payload}.")
-            return payload.get(name)
+                if name not in payload and not allow_none:
+                    raise Exception(f"Payload Editor: {name} not found in {payload}.")
+                return payload.get(name)
 
     def get_var(self, payload, name, device=None, **kwargs):
         return self.payload_helper(payload, name, device=device, **kwargs)
@@ -873,20 +1035,49 @@ class Run(AbstractBase):
             variables[_self.iteration_variable_name] = iteration_value
         return variables
 
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def compile_code(source, mode="eval"):
+        if mode == "eval":
+            source = source.lstrip(" \t")
+        return builtins["compile"](source, "<string>", mode)
+
     def eval(_self, query, function="eval", **locals):  # noqa: N805
         exec_variables = _self.global_variables(**locals)
-        results = builtins[function](query, exec_variables)
+        code = _self.compile_code(query, function)
+        results = builtins[function](code, exec_variables)
         return results, exec_variables
 
-    def sub(self, input, variables):
-        r = compile("{{(.*?)}}")
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def parse_template(template):
+        segments = Run.substitution_regex.split(template)
+        return tuple(
+            Run.compile_code(segment.strip()) if is_expression else segment
+            for segment, is_expression in zip(segments, cycle((False, True)))
+            if is_expression or segment
+        )
 
-        def replace(match):
-            return str(self.eval(match.group()[2:-2], **variables)[0])
+    def sub(self, input, variables):
+        namespace = None
+
+        def substitute(template):
+            nonlocal namespace
+            segments = self.parse_template(template)
+            if all(isinstance(segment, str) for segment in segments):
+                return template
+            if namespace is None:
+                namespace = self.global_variables(**variables)
+            return "".join(
+                segment
+                if isinstance(segment, str)
+                else str(builtins["eval"](segment, namespace))
+                for segment in segments
+            )
 
         def rec(input):
             if isinstance(input, str):
-                return r.sub(replace, input)
+                return substitute(input)
             elif isinstance(input, list):
                 return [rec(x) for x in input]
             elif isinstance(input, dict):
@@ -918,36 +1109,42 @@ class Run(AbstractBase):
         return connection
 
     def netmiko_connection(self, device):
-        connection = self.get_or_close_connection("netmiko", device.name)
+        session = self.get_connection_session("netmiko", device)
+        connection = self.get_or_close_connection("netmiko", device.name, session)
         if connection:
             self.log("info", "Using cached Netmiko connection", device)
             return self.update_netmiko_connection(connection)
         self.log("info", "Opening new Netmiko connection", device)
         username, password = self.get_credentials(device)
         driver = device.netmiko_driver if self.use_device_driver else self.driver
-        netmiko_connection = ConnectHandler(
-            device_type=driver,
-            ip=device.ip_address,
-            port=device.port,
-            username=username,
-            password=password,
-            secret=device.enable_password,
-            fast_cli=self.fast_cli,
-            timeout=self.timeout,
-            global_delay_factor=self.global_delay_factor,
-            session_log=BytesIO(),
-        )
+        try:
+            netmiko_connection = ConnectHandler(
+                device_type=driver,
+                ip=device.ip_address,
+                port=device.port,
+                username=username,
+                password=password,
+                secret=device.enable_password,
+                fast_cli=self.fast_cli,
+                timeout=self.timeout,
+                global_delay_factor=self.global_delay_factor,
+                session_log=BytesIO(),
+            )
+        except Exception:
+            app.connections_cache.close("netmiko", self.parent_runtime, device.name)
+            raise
         if self.enable_mode:
             netmiko_connection.enable()
         if self.config_mode:
             netmiko_connection.config_mode()
-        app.connections_cache["netmiko"][self.parent_runtime][
-            device.name
-        ] = netmiko_connection
+        app.connections_cache.add(
+            "netmiko", self.parent_runtime, device.name, netmiko_connection, session
+        )
         return netmiko_connection
 
     def napalm_connection(self, device):
-        connection = self.get_or_close_connection("napalm", device.name)
+        session = self.get_connection_session("napalm", device)
+        connection = self.get_or_close_connection("napalm", device.name, session)
         if connection:
             self.log("info", "Using cached NAPALM connection", device)
             return connection
@@ -968,54 +1165,49 @@ class Run(AbstractBase):
             timeout=self.timeout,
             optional_args=optional_args,
         )
-        napalm_connection.open()
-        app.connections_cache["napalm"][self.parent_runtime][
-            device.name
-        ] = napalm_connection
+        try:
+            napalm_connection.open()
+        except Exception:
+            app.connections_cache.close("napalm", self.parent_runtime, device.name)
+            raise
+        app.connections_cache.add(
+            "napalm", self.parent_runtime, device.name, napalm_connection, session
+        )
         return napalm_connection
 
-    def get_or_close_connection(self, library, device):
-        connection = self.get_connection(library, device)
-        if not connection:
+    def get_connection_session(self, library, device):
+        if not getattr(self, "persistent_connection", False):
             return
-        if self.start_new_connection:
-            return self.disconnect(library, device, connection)
-        if library == "napalm":
-            if connection.is_alive():
-                return connection
-            else:
-                self.disconnect(library, device, connection)
+        driver = getattr(device, f"{library}_driver")
+        if not self.use_device_driver:
+            driver = self.driver
+        if library == "netmiko":
+            mode = (self.enable_mode, self.config_mode)
         else:
-            try:
-                connection.find_prompt()
-                return connection
-            except Exception:
-                self.disconnect(library, device, connection)
+            mode = str(self.service.optional_args)
+        address = (device.name, device.ip_address, device.port)
+        return (*address, *self.get_credentials(device), driver, mode)
 
-    def get_connection(self, library, device):
-        cache = app.connections_cache[library].get(self.parent_runtime, {})
-        return cache.get(device)
+    def get_or_close_connection(self, library, device, session=None):
+        if self.start_new_connection:
+            self.disconnect(library, device, discard=True)
+        cache = app.connections_cache
+        connection = cache.get(library, self.parent_runtime, device, session)
+        return None if self.start_new_connection else connection
 
-    def close_device_connection(self, device):
+    def close_device_connection(self, device, discard=False):
         for library in ("netmiko", "napalm"):
-            connection = self.get_connection(library, device)
-            if connection:
-                self.disconnect(library, device, connection)
+            self.disconnect(library, device, discard)
 
     def close_remaining_connections(self):
-        for library in ("netmiko", "napalm"):
-            for connection in app.connections_cache[library][self.runtime].items():
-                Thread(target=self.disconnect, args=(library, *connection)).start()
-        current_thread = currentThread()
-        for thread in enumerate():
-            if thread != current_thread:
-                thread.join()
-
-    def disconnect(self, library, device, connection):
+        app.connections_cache.close_runtime(self.runtime)
+
+    def disconnect(self, library, device, discard=False):
         try:
-            connection.disconnect() if library == "netmiko" else connection.close()
-            app.connections_cache[library][self.parent_runtime].pop(device)
-            self.log("info", f"Closed {library} connection", device)
+            cache = app.connections_cache
+            status = cache.close(library, self.parent_runtime, device, discard)
+            if status:
+                self.log("info", f"{status.capitalize()} {library} connection", device)
         except Exception as exc:
             self.log(
                 "error", f"Error while closing {library} connection ({exc})", device
@@ -1,11 +1,33 @@
-from re import search, sub
-from sqlalchemy import Boolean, Float, ForeignKey, Integer
+from functools import lru_cache
+from re import compile, search, sub
+from sqlalchemy import (
+    and_,
+    BINARY,
+    Boolean,
+    cast,
+    Float,
+    ForeignKey,
+    func,
+    Index,
+    inspect,
+    Integer,
+    literal,
+    or_,
+    String,
+    true,
+)
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import backref, relationship
 from sqlalchemy.schema import UniqueConstraint
 
 from eNMS import app
-from eNMS.database.dialect import Column, LargeString, SmallString
+from eNMS.database import DIALECT, Session as DatabaseSession
+from eNMS.database.dialect import (
+    Column,
+    CompressedJSONType,
+    LargeString,
+    SmallString,
+)
 from eNMS.database.functions import fetch, fetch_all
 from eNMS.database.associations import (
     pool_device_table,
@@ -18,6 +40,7 @@ from eNMS.database.associations import (
     task_pool_table,
 )
 from eNMS.database.base import AbstractBase
+from eNMS.models import models
 from eNMS.setup import properties
 
 
@@ -35,19 +58,38 @@ class Object(AbstractBase):
     vendor = Column(SmallString)
 
     def update(self, **kwargs):
+        filtering_properties = properties["filtering"][self.class_type]
+        is_new = not inspect(self).has_identity
+        if not is_new:
+            old_values = {
+                property: str(getattr(self, property))
+                for property in filtering_properties
+            }
         super().update(**kwargs)
         if kwargs.get("dont_update_pools", False):
             return
+        changed_properties = {
+            property
+            for property in filtering_properties
+            if is_new or str(getattr(self, property)) != old_values[property]
+        }
+        if not changed_properties:
+            return
+        number = f"{self.class_type}_number"
         for pool in fetch_all("pool"):
             if pool.never_update:
                 continue
+            pool_properties = {
+                property for property, *_ in pool.criteria(self.class_type)
+            }
+            if not is_new and not changed_properties & pool_properties:
+                continue
             match = pool.object_match(self)
-            relation, number = f"{self.class_type}s", f"{self.class_type}_number"
-            if match and self not in getattr(pool, relation):
-                getattr(pool, relation).append(self)
+            if match and pool not in self.pools:
+                self.pools.append(pool)
                 setattr(pool, number, getattr(pool, number) + 1)
-            if self in getattr(pool, relation) and not match:
-                getattr(pool, relation).remove(self)
+            if pool in self.pools and not match:
+                self.pools.remove(pool)
                 setattr(pool, number, getattr(pool, number) - 1)
 
     def delete(self):
@@ -91,7 +133,7 @@ class Device(CustomDevice):
     icon = Column(SmallString, default="router")
     operating_system = Column(SmallString)
     os_version = Column(SmallString)
-    ip_address = Column(SmallString)
+    ip_address = Column(SmallString, index=True)
     longitude = Column(SmallString, default="0.0")
     latitude = Column(SmallString, default="0.0")
     port = Column(Integer, default=22)
@@ -121,6 +163,9 @@ class Device(CustomDevice):
     sessions = relationship(
         "Session", back_populates="device", cascade="all, delete-orphan"
     )
+    data_versions = relationship(
+        "DataVersion", back_populates="device", cascade="all, delete-orphan"
+    )
 
     def table_properties(self, **kwargs):
         properties = super().get_properties()
@@ -200,6 +245,7 @@ class Link(Object):
         backref=backref("destination", cascade="all, delete-orphan"),
     )
     destination_name = association_proxy("destination", "name")
+    eager_load = ["source", "destination"]
     pools = relationship("Pool", secondary=pool_link_table, back_populates="links")
     __table_args__ = (UniqueConstraint(name, source_id, destination_id),)
 
@@ -236,6 +282,45 @@ class Link(Object):
         super().update(**kwargs)
 
 
+def compile_predicate(value, match):
+    if match == "inclusion":
+        return lambda object_value: value in object_value
+    elif match == "equality":
+        return lambda object_value: value == object_value
+    else:
+        return compile(value).search
+
+
+@lru_cache(maxsize=4096)
+def compile_pool_matcher(operator, criteria, property_number):
+    predicates = [
+        (property, compile_predicate(value, match))
+        for property, value, match in criteria
+    ]
+    if operator != "all" and len(criteria) < property_number:
+        return lambda obj: True
+    function = all if operator == "all" else any
+    return lambda obj: function(
+        predicate(str(getattr(obj, property))) for property, predicate in predicates
+    )
+
+
+def compile_sql_predicate(column, value, match):
+    if not isinstance(column.type, String):
+        column = cast(column, String)
+    column = func.coalesce(column, "None")
+    if DIALECT == "mysql":  # default collations are case-insensitive
+        column, value = cast(column, BINARY), cast(literal(value), BINARY)
+    if match == "inclusion":
+        if DIALECT == "postgresql":
+            return column.contains(value, autoescape=True)
+        return func.instr(column, value) > 0
+    elif match == "equality":
+        return column == value
+    else:
+        return column.op("~" if DIALECT == "postgresql" else "REGEXP")(value)
+
+
 AbstractPool = type(
     "AbstractPool",
     (AbstractBase,),
@@ -294,33 +379,78 @@ class Pool(AbstractPool):
         super().update(**kwargs)
         self.compute_pool()
 
-    def property_match(self, obj, property):
-        pool_value = getattr(self, f"{obj.class_type}_{property}")
-        object_value = str(getattr(obj, property))
-        match = getattr(self, f"{obj.class_type}_{property}_match")
-        if not pool_value:
-            return True
-        elif match == "inclusion":
-            return pool_value in object_value
-        elif match == "equality":
-            return pool_value == object_value
-        else:
-            return bool(search(pool_value, object_value))
+    def criteria(self, class_type):
+        return tuple(
+            (
+                property,
+                getattr(self, f"{class_type}_{property}"),
+                getattr(self, f"{class_type}_{property}_match"),
+            )
+            for property in properties["filtering"][class_type]
+            if getattr(self, f"{class_type}_{property}")
+        )
 
-    def object_match(self, obj):
-        operator = all if self.operator == "all" else any
-        return operator(
-            self.property_match(obj, property)
-            for property in properties["filtering"][obj.class_type]
+    def matcher(self, class_type):
+        return compile_pool_matcher(
+            self.operator,
+            self.criteria(class_type),
+            len(properties["filtering"][class_type]),
         )
 
-    def compute_pool(self):
+    def object_match(self, obj):
+        return self.matcher(obj.class_type)(obj)
+
+    def sql_filter(self, class_type):
+        model, constraints = models[class_type], []
+        criteria = self.criteria(class_type)
+        if self.operator != "all" and len(criteria) < len(
+            properties["filtering"][class_type]
+        ):
+            return true()
+        for property, value, match in criteria:
+            attribute = getattr(model, property)
+            if hasattr(attribute, "target_collection"):
+                relation = getattr(model, attribute.target_collection)
+                column = getattr(relation.property.mapper.class_, attribute.value_attr)
+                predicate = compile_sql_predicate(column, value, match)
+                constraints.append(relation.has(predicate))
+            else:
+                constraints.append(compile_sql_predicate(attribute, value, match))
+        if not constraints:
+            return true()
+        return (and_ if self.operator == "all" else or_)(*constraints)
+
+    def compute_pool_in_database(self):
+        DatabaseSession.add(self)
+        DatabaseSession.flush()
+        for class_type, table in (
+            ("device", pool_device_table),
+            ("link", pool_link_table),
+        ):
+            DatabaseSession.execute(table.delete().where(table.c.pool_id == self.id))
+            query = DatabaseSession.query(
+                literal(self.id), models[class_type].id
+            ).filter(self.sql_filter(class_type))
+            insert = table.insert().from_select(
+                ["pool_id", f"{class_type}_id"], query.statement
+            )
+            number = DatabaseSession.execute(insert).rowcount
+            setattr(self, f"{class_type}_number", number)
+        DatabaseSession.expire(self, ["devices", "links"])
+        for instance in DatabaseSession.identity_map.values():
+            if isinstance(instance, Object) and "pools" in instance.__dict__:
+                DatabaseSession.expire(instance, ["pools"])
+
+    def compute_pool(self, objects=None):
         if self.never_update:
             return
-        self.devices = list(filter(self.object_match, fetch_all("device")))
-        self.device_number = len(self.devices)
-        self.links = list(filter(self.object_match, fetch_all("link")))
-        self.link_number = len(self.links)
+        if app.settings["database"]["pool_computation"] == "sql":
+            return self.compute_pool_in_database()
+        for class_type in ("device", "link"):
+            instances = objects[class_type] if objects else fetch_all(class_type)
+            matches = list(filter(self.matcher(class_type), instances))
+            setattr(self, f"{class_type}s", matches)
+            setattr(self, f"{class_type}_number", len(matches))
 
 
 class Session(AbstractBase):
@@ -337,3 +467,27 @@ class Session(AbstractBase):
         "Device", back_populates="sessions", foreign_keys="Session.device_id"
     )
     device_name = association_proxy("device", "name")
+    eager_load = ["device"]
+
+
+class DataVersion(AbstractBase):
+
+    __tablename__ = type = "data_version"
+    private = True
+    dont_track_changes = True
+    id = Column(Integer, primary_key=True)
+    device_id = Column(Integer, ForeignKey("device.id"))
+    device = relationship("Device", back_populates="data_versions")
+    data_type = Column(SmallString)
+    version = Column(Integer)
+    base_version = Column(Integer)
+    time = Column(SmallString)
+    hash = Column(SmallString)
+    delta = Column(CompressedJSONType)
+    __table_args__ = (
+        Index("ix_data_version_device", device_id, data_type, version, unique=True),
+    )
+
+    @property
+    def is_snapshot(self):
+        return self.version == self.base_version
@@ -1,7 +1,7 @@
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
 from re import search
-from sqlalchemy import Boolean, case, ForeignKey, Integer
+from sqlalchemy import Boolean, case, event, Float, ForeignKey, Integer
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
@@ -31,6 +31,7 @@ class Task(AbstractBase):
     start_date = Column(SmallString)
     end_date = Column(SmallString)
     crontab_expression = Column(SmallString)
+    jitter = Column(Integer, default=0)
     is_active = Column(Boolean, default=False)
     initial_payload = Column(MutableDict)
     devices = relationship(
@@ -41,6 +42,7 @@ class Task(AbstractBase):
     service = relationship("Service", back_populates="tasks")
     service_name = association_proxy("service", "name")
     model_properties = ["next_run_time", "time_before_next_run", "status"]
+    eager_load = ["service"]
 
     def __init__(self, **kwargs):
         super().update(**kwargs)
@@ -67,18 +69,30 @@ class Task(AbstractBase):
     def status(cls):  # noqa: N805
         return case([(cls.is_active, "Active")], else_="Inactive")
 
+    @classmethod
+    def prefetch_next_run_times(cls, tasks):
+        job_ids = None if len(tasks) > 500 else [task.aps_job_id for task in tasks]
+        next_run_times = app.get_next_run_times(job_ids)
+        for task in tasks:
+            task.__dict__["aps_next_run_time"] = next_run_times.get(task.aps_job_id)
+
+    @property
+    def aps_next_run_time(self):
+        if "aps_next_run_time" not in self.__dict__:
+            next_run_times = app.get_next_run_times([self.aps_job_id])
+            self.__dict__["aps_next_run_time"] = next_run_times.get(self.aps_job_id)
+        return self.__dict__["aps_next_run_time"]
+
     @property
     def next_run_time(self):
-        job = app.scheduler.get_job(self.aps_job_id)
-        if job and job.next_run_time:
-            return job.next_run_time.strftime("%Y-%m-%d %H:%M:%S")
+        if self.aps_next_run_time:
+            return self.aps_next_run_time.strftime("%Y-%m-%d %H:%M:%S")
         return None
 
     @property
     def time_before_next_run(self):
-        job = app.scheduler.get_job(self.aps_job_id)
-        if job and job.next_run_time:
-            delta = job.next_run_time.replace(tzinfo=None) - datetime.now()
+        if self.aps_next_run_time:
+            delta = self.aps_next_run_time.replace(tzinfo=None) - datetime.now()
             hours, remainder = divmod(delta.seconds, 3600)
             minutes, seconds = divmod(remainder, 60)
             days = f"{delta.days} days, " if delta.days else ""
@@ -97,6 +111,7 @@ class Task(AbstractBase):
         self.is_active = False
         Session.commit()
         app.scheduler.pause_job(self.aps_job_id)
+        self.__dict__.pop("aps_next_run_time", None)
 
     def resume(self):
         self.schedule()
@@ -113,9 +128,10 @@ class Task(AbstractBase):
         return properties
 
     def kwargs(self):
+        queue = app.settings["automation"]["job_queue"]["active"]
         default = {
             "id": self.aps_job_id,
-            "func": app.run,
+            "func": app.queue_run if queue else app.run,
             "replace_existing": True,
             "args": [self.service.id],
             "kwargs": self.run_properties(),
@@ -136,6 +152,7 @@ class Task(AbstractBase):
             }
             expression[-1] = ",".join(mapping[day] for day in expression[-1].split(","))
             trigger = {"trigger": CronTrigger.from_crontab(" ".join(expression))}
+            trigger["trigger"].jitter = self.jitter or None
         elif self.frequency:
             self.periodic = True
             frequency_in_seconds = (
@@ -149,6 +166,7 @@ class Task(AbstractBase):
                 "start_date": self.aps_date("start_date"),
                 "end_date": self.aps_date("end_date"),
                 "seconds": frequency_in_seconds,
+                "jitter": self.jitter or None,
             }
         else:
             self.periodic = False
@@ -161,6 +179,30 @@ class Task(AbstractBase):
             app.scheduler.add_job(**{**default, **trigger})
         else:
             app.scheduler.reschedule_job(default.pop("id"), **trigger)
+        self.__dict__.pop("aps_next_run_time", None)
+
+
+@event.listens_for(Task, "expire")
+def expire_next_run_time(task, attributes):
+    task.__dict__.pop("aps_next_run_time", None)
+
+
+class Job(AbstractBase):
+
+    __tablename__ = type = "job"
+    private = True
+    dont_track_changes = True
+    id = Column(Integer, primary_key=True)
+    runtime = Column(SmallString)
+    service_id = Column(Integer)
+    status = Column(SmallString, default="Queued", index=True)
+    runner = Column(SmallString)
+    heartbeat = Column(Float)
+    kwargs = Column(MutableDict)
+
+    @property
+    def name(self):
+        return f"{self.runtime} ({self.status})"
 
 
 class Event(AbstractBase):
@@ -175,6 +217,7 @@ class Event(AbstractBase):
     service_id = Column(Integer, ForeignKey("service.id"))
     service = relationship("Service", back_populates="events")
     service_name = association_proxy("service", "name")
+    eager_load = ["service"]
 
     def match_log(self, source, content):
         source_match = (
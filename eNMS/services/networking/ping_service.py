@@ -1,5 +1,8 @@
+from asyncio import create_subprocess_exec, open_connection, wait_for
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio.subprocess import PIPE
 from socket import error, gaierror, socket, timeout
-from subprocess import check_output
+from subprocess import CalledProcessError, check_output
 from sqlalchemy import ForeignKey, Integer
 from wtforms import HiddenField, IntegerField, SelectField, StringField
 
@@ -22,36 +25,43 @@ class PingService(Service):
 
     __mapper_args__ = {"polymorphic_identity": "ping_service"}
 
+    def ping_command(self, run, device):
+        command = ["ping"]
+        for x, property in (
+            ("c", "count"),
+            ("W", "timeout"),
+            ("t", "ttl"),
+            ("s", "packet_size"),
+        ):
+            value = getattr(self, property)
+            if value:
+                command.extend(f"-{x} {value}".split())
+        command.append(device.ip_address)
+        run.log("info", f"Running PING ({command})", device)
+        return command
+
+    def ping_results(self, run, output):
+        output = output.decode().strip().splitlines()
+        total = output[-2].split(",")[3].split()[1]
+        loss = output[-2].split(",")[2].split()[0]
+        timing = output[-1].split()[3].split("/")
+        return {
+            "success": True,
+            "result": {
+                "probes_sent": run.count,
+                "packet_loss": loss,
+                "rtt_min": timing[0],
+                "rtt_max": timing[2],
+                "rtt_avg": timing[1],
+                "rtt_stddev": timing[3],
+                "total rtt": total,
+            },
+        }
+
     def job(self, run, payload, device):
         if run.protocol == "ICMP":
-            command = ["ping"]
-            for x, property in (
-                ("c", "count"),
-                ("W", "timeout"),
-                ("t", "ttl"),
-                ("s", "packet_size"),
-            ):
-                value = getattr(self, property)
-                if value:
-                    command.extend(f"-{x} {value}".split())
-            command.append(device.ip_address)
-            run.log("info", f"Running PING ({command})", device)
-            output = check_output(command).decode().strip().splitlines()
-            total = output[-2].split(",")[3].split()[1]
-            loss = output[-2].split(",")[2].split()[0]
-            timing = output[-1].split()[3].split("/")
-            return {
-                "success": True,
-                "result": {
-                    "probes_sent": run.count,
-                    "packet_loss": loss,
-                    "rtt_min": timing[0],
-                    "rtt_max": timing[2],
-                    "rtt_avg": timing[1],
-                    "rtt_stddev": timing[3],
-                    "total rtt": total,
-                },
-            }
+            output = check_output(self.ping_command(run, device))
+            return self.ping_results(run, output)
         else:
             result = {}
             for port in map(int, run.ports.split(",")):
@@ -66,6 +76,26 @@ class PingService(Service):
                 result[port] = connection
             return {"success": all(result.values()), "result": result}
 
+    async def async_job(self, run, payload, device):
+        if run.protocol == "ICMP":
+            command = self.ping_command(run, device)
+            process = await create_subprocess_exec(*command, stdout=PIPE)
+            output, _ = await process.communicate()
+            if process.returncode:
+                raise CalledProcessError(process.returncode, command, output)
+            return self.ping_results(run, output)
+        else:
+            result = {}
+            for port in map(int, run.ports.split(",")):
+                try:
+                    connection = open_connection(device.ip_address, port)
+                    _, writer = await wait_for(connection, run.timeout)
+                    writer.close()
+                    result[port] = True
+                except (AsyncTimeoutError, OSError):
+                    result[port] = False
+            return {"success": all(result.values()), "result": result}
+
 
 class PingForm(ServiceForm):
     form_type = HiddenField(default="ping_service")
@@ -5,6 +5,7 @@ from re import M, sub
 from sqlalchemy import Boolean, Float, ForeignKey, Integer
 from wtforms import FieldList, FormField, HiddenField, StringField
 
+from eNMS import app
 from eNMS.database.dialect import Column, MutableList, LargeString, SmallString
 from eNMS.forms.automation import NetmikoForm
 from eNMS.models.automation import ConnectionService
@@ -53,9 +54,10 @@ class DataBackupService(ConnectionService):
                         )
                         for cmd in value
                     )
-                setattr(device, data, result)
-                with open(path / data, "w") as file:
-                    file.write(result)
+                changed = app.update_device_data(device, data, result)
+                if changed or not (path / data).exists():
+                    with open(path / data, "w") as file:
+                        file.write(result)
             device.last_status = "Success"
             device.last_duration = (
                 f"{(datetime.now() - device.last_runtime).total_seconds()}s"
@@ -34,9 +34,9 @@ class NapalmBackupService(ConnectionService):
             device.last_runtime = datetime.now()
             napalm_connection = run.napalm_connection(device)
             run.log("info", "Fetching Operational Data", device)
-            for data_type in ("configuration_getters", "operational_data_getters"):
+            for data in ("configuration", "operational_data"):
                 result = {}
-                for getter in getattr(run, data_type):
+                for getter in getattr(run, f"{data}_getters"):
                     try:
                         output = app.str_dict(getattr(napalm_connection, getter)())
                         for r in self.replacements:
@@ -47,9 +47,10 @@ class NapalmBackupService(ConnectionService):
                     except Exception as exc:
                         result[getter] = f"{getter} failed because of {exc}"
                 result = app.str_dict(result)
-                setattr(device, data_type, result)
-                with open(path / data_type, "w") as file:
-                    file.write(result)
+                changed = app.update_device_data(device, data, result)
+                if changed or not (path / data).exists():
+                    with open(path / data, "w") as file:
+                        file.write(result)
             device.last_status = "Success"
             device.last_duration = (
                 f"{(datetime.now() - device.last_runtime).total_seconds()}s"
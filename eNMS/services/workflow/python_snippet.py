@@ -22,7 +22,7 @@ class PythonSnippetService(Service):
     def job(self, run, payload, device=None):
 
         try:
-            code_object = compile(run.source_code, "user_python_code", "exec")
+            code_object = run.compile_code(run.source_code, "exec")
         except Exception as exc:
             run.log("info", f"Compile error: {str(exc)}")
             return {"success": False, "result": {"step": "compile", "error": str(exc)}}
@@ -83,3 +83,4 @@ results["success"] = True
 results["result"] = result""",
     )
     query_fields = ServiceForm.query_fields + ["source_code"]
+    exec_fields = ServiceForm.exec_fields + ["source_code"]
@@ -1,7 +1,8 @@
 from collections import defaultdict
-from sqlalchemy import Boolean, ForeignKey, Integer
+from concurrent.futures import Future, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from sqlalchemy import Boolean, event, ForeignKey, Integer
 from sqlalchemy.orm import backref, relationship
-from wtforms import BooleanField, HiddenField, SelectField
+from wtforms import BooleanField, HiddenField, IntegerField, SelectField
 
 from eNMS.database import Session
 from eNMS.database.base import AbstractBase
@@ -19,6 +20,7 @@ class Workflow(Service):
     parent_type = "service"
     id = Column(Integer, ForeignKey("service.id"), primary_key=True)
     close_connection = Column(Boolean, default=False)
+    max_parallel_services = Column(Integer, default=1)
     labels = Column(MutableDict, info={"dont_track_changes": True})
     services = relationship(
         "Service", secondary=service_workflow_table, back_populates="workflows"
@@ -28,6 +30,7 @@ class Workflow(Service):
     )
 
     __mapper_args__ = {"polymorphic_identity": "workflow"}
+    adjacency_cache = {}
 
     def __init__(self, **kwargs):
         start = fetch("service", scoped_name="Start")
@@ -95,74 +98,179 @@ class Workflow(Service):
     def deep_edges(self):
         return sum([w.edges for w in self.deep_services if w.type == "workflow"], [])
 
+    @property
+    def adjacency(self):
+        last_modified, adjacency = self.adjacency_cache.get(self.id, (None, None))
+        if adjacency is None or last_modified != self.last_modified:
+            adjacency = {"source": defaultdict(list), "destination": defaultdict(list)}
+            edges = Session.query(
+                WorkflowEdge.id,
+                WorkflowEdge.subtype,
+                WorkflowEdge.source_id,
+                WorkflowEdge.destination_id,
+            ).filter_by(workflow_id=self.id)
+            for edge_id, subtype, source_id, destination_id in edges:
+                adjacency["destination"][(source_id, subtype)].append(
+                    (destination_id, edge_id)
+                )
+                adjacency["source"][(destination_id, subtype)].append(
+                    (source_id, edge_id)
+                )
+            adjacency = {key: dict(value) for key, value in adjacency.items()}
+            self.adjacency_cache[self.id] = (self.last_modified, adjacency)
+        return adjacency
+
     def job(self, run, *args):
         if run.run_method == "per_service_with_workflow_targets":
             return self.tracking_bfs(run, *args)
         else:
             return self.standard_bfs(run, *args)
 
-    def tracking_bfs(self, run, payload):
-        number_of_runs = defaultdict(int)
-        start = fetch("service", scoped_name="Start")
-        end = fetch("service", scoped_name="End")
-        services = [fetch("service", id=id) for id in run.start_services]
-        visited, success, targets = set(), False, defaultdict(set)
+    @staticmethod
+    def neighbors(adjacency, service, direction, subtype):
+        for service_id, edge_id in adjacency[direction].get((service.id, subtype), []):
+            yield fetch("service", id=service_id), edge_id
+
+    def traverse(self, run, payload, adjacency, skipped, get_kwargs, propagate):
+        endpoints = (
+            fetch("service", scoped_name="Start"),
+            fetch("service", scoped_name="End"),
+        )
         restart_run = run.restart_run
-        for service in services:
-            targets[service.name] |= {device.name for device in run.devices}
+        services = [fetch("service", id=id) for id in run.start_services]
+        kwargs = {"workflow": self.id, "parent_runtime": run.parent_runtime}
+        if run.parent_device_id:
+            kwargs["parent_device"] = run.parent_device_id
+
+        def execute(service, executor=None):
+            if service in endpoints:
+                return skipped
+            service_kwargs = {"service": service.id, **kwargs, **get_kwargs(service)}
+            if not executor:
+                service_kwargs.update(parent=run, restart_run=restart_run)
+                return factory("run", **service_kwargs).run(payload)
+            ids = (run.id, getattr(restart_run, "id", None))
+            return executor.submit(self.thread_run, payload, *ids, **service_kwargs)
+
+        if self.max_parallel_services > 1:
+            traversal = self.parallel_traversal
+        else:
+            traversal = self.serial_traversal
+        visited = traversal(run, services, adjacency, execute, propagate)
+        if visited is None:
+            return
+        Session.refresh(run)
+        run.restart_run = restart_run
+        return visited
+
+    def prerequisites_met(self, adjacency, service, visited):
+        prerequisites = self.neighbors(adjacency, service, "source", "prerequisite")
+        return all(node in visited for node, _ in prerequisites)
+
+    def serial_traversal(self, run, services, adjacency, execute, propagate):
+        number_of_runs, visited = defaultdict(int), set()
         while services:
             if run.stop:
-                return {"payload": payload, "success": False}
+                return
             service = services.pop()
-            if number_of_runs[service.name] >= service.maximum_runs or any(
-                node not in visited
-                for node, _ in service.adjacent_services(self, "source", "prerequisite")
-            ):
+            if number_of_runs[service.name] >= service.maximum_runs:
+                continue
+            if not self.prerequisites_met(adjacency, service, visited):
                 continue
             number_of_runs[service.name] += 1
             visited.add(service)
-            if service in (start, end):
-                results = {
-                    "summary": {
-                        "success": {device.name for device in run.devices},
-                        "failure": [],
-                    },
-                    "success": True,
-                }
-            else:
-                kwargs = {
-                    "devices": [
-                        fetch("device", name=name).id for name in targets[service.name]
-                    ],
-                    "service": service.id,
-                    "workflow": self.id,
-                    "restart_run": restart_run,
-                    "parent": run,
-                    "parent_runtime": run.parent_runtime,
-                }
-                if run.parent_device_id:
-                    kwargs["parent_device"] = run.parent_device_id
-                service_run = factory("run", **kwargs)
-                results = service_run.run(payload)
+            services.extend(propagate(service, execute(service)))
+        return visited
+
+    def parallel_traversal(self, run, services, adjacency, execute, propagate):
+        number_of_runs, visited, done, running = defaultdict(int), set(), set(), {}
+        with ThreadPoolExecutor(self.max_parallel_services) as executor:
+            while services or running:
+                if run.stop:
+                    return
+                for service in list(services):
+                    if service in running.values():
+                        continue
+                    if number_of_runs[service.name] >= service.maximum_runs:
+                        services.remove(service)
+                        continue
+                    if not self.prerequisites_met(adjacency, service, done):
+                        continue
+                    services.remove(service)
+                    number_of_runs[service.name] += 1
+                    visited.add(service)
+                    future = execute(service, executor)
+                    if isinstance(future, dict):
+                        results, future = future, Future()
+                        future.set_result(results)
+                    running[future] = service
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    service = running.pop(future)
+                    done.add(service)
+                    services.extend(propagate(service, future.result()))
+        return visited
+
+    @staticmethod
+    def thread_run(payload, parent_id, restart_run_id, **kwargs):
+        try:
+            kwargs["parent"] = fetch("run", id=parent_id)
+            kwargs["restart_run"] = fetch("run", allow_none=True, id=restart_run_id)
+            return factory("run", **kwargs).run(payload)
+        finally:
+            Session.remove()
+
+    def tracking_bfs(self, run, payload):
+        start = fetch("service", scoped_name="Start")
+        end = fetch("service", scoped_name="End")
+        adjacency, targets = self.adjacency, defaultdict(set)
+        for id in run.start_services:
+            targets[fetch("service", id=id).name] |= {
+                device.name for device in run.devices
+            }
+        skipped = {
+            "summary": {
+                "success": {device.name for device in run.devices},
+                "failure": [],
+            },
+            "success": True,
+        }
+
+        def get_kwargs(service):
+            return {
+                "devices": [
+                    fetch("device", name=name).id for name in targets[service.name]
+                ]
+            }
+
+        def propagate(service, results):
+            successors = []
             if service.run_method in ("once", "per_service_with_service_targets"):
                 edge_type = "success" if results["success"] else "failure"
-                for successor, edge in service.adjacent_services(
-                    self, "destination", edge_type
+                for successor, edge_id in self.neighbors(
+                    adjacency, service, "destination", edge_type
                 ):
                     targets[successor.name] |= targets[service.name]
-                    services.append(successor)
-                    run.edge_state[edge.id] += len(targets[service.name])
+                    successors.append(successor)
+                    run.edge_state[edge_id] += len(targets[service.name])
             else:
                 summary = results.get("summary", {})
                 for edge_type in ("success", "failure"):
-                    for successor, edge in service.adjacent_services(
-                        self, "destination", edge_type,
+                    for successor, edge_id in self.neighbors(
+                        adjacency, service, "destination", edge_type
                     ):
                         if not summary[edge_type]:
                             continue
                         targets[successor.name] |= set(summary[edge_type])
-                        services.append(successor)
-                        run.edge_state[edge.id] += len(summary[edge_type])
+                        successors.append(successor)
+                        run.edge_state[edge_id] += len(summary[edge_type])
+            return successors
+
+        visited = self.traverse(run, payload, adjacency, skipped, get_kwargs, propagate)
+        if visited is None:
+            return {"payload": payload, "success": False}
         success_devices = targets[end.name]
         failure_devices = targets[start.name] - success_devices
         success = not failure_devices
@@ -173,63 +281,43 @@ class Workflow(Service):
         run.run_state["progress"]["device"]["success"] = len(success_devices)
         run.run_state["progress"]["device"]["failure"] = len(failure_devices)
         run.run_state["summary"] = summary
-        Session.refresh(run)
-        run.restart_run = restart_run
         return {"payload": payload, "success": success}
 
     def standard_bfs(self, run, payload, device=None):
-        number_of_runs = defaultdict(int)
-        start = fetch("service", scoped_name="Start")
         end = fetch("service", scoped_name="End")
-        services = [fetch("service", id=id) for id in run.start_services]
-        restart_run = run.restart_run
-        visited = set()
-        while services:
-            if run.stop:
-                return {"payload": payload, "success": False}
-            service = services.pop()
-            if number_of_runs[service.name] >= service.maximum_runs or any(
-                node not in visited
-                for node, _ in service.adjacent_services(self, "source", "prerequisite")
-            ):
-                continue
-            number_of_runs[service.name] += 1
-            visited.add(service)
-            if service in (start, end):
-                results = {"result": "skipped", "success": True}
-            else:
-                kwargs = {
-                    "service": service.id,
-                    "workflow": self.id,
-                    "restart_run": restart_run,
-                    "parent": run,
-                    "parent_runtime": run.parent_runtime,
-                }
-                if run.parent_device_id:
-                    kwargs["parent_device"] = run.parent_device_id
-                if device:
-                    kwargs["devices"] = [device.id]
-                service_run = factory("run", **kwargs)
-                results = service_run.run(payload)
+        adjacency = self.adjacency
+        skipped = {"result": "skipped", "success": True}
+
+        def get_kwargs(service):
+            return {"devices": [device.id]} if device else {}
+
+        def propagate(service, results):
             if not device:
                 status = "success" if results["success"] else "failure"
                 run.run_state["progress"]["service"][status] += 1
-            for successor, edge in service.adjacent_services(
-                self, "destination", "success" if results["success"] else "failure",
+            successors, edge_type = [], "success" if results["success"] else "failure"
+            for successor, edge_id in self.neighbors(
+                adjacency, service, "destination", edge_type
             ):
-                services.append(successor)
+                successors.append(successor)
                 if device:
-                    run.edge_state[edge.id] += 1
+                    run.edge_state[edge_id] += 1
                 else:
-                    run.edge_state[edge.id] = "DONE"
-        Session.refresh(run)
-        run.restart_run = restart_run
+                    run.edge_state[edge_id] = "DONE"
+            return successors
+
+        visited = self.traverse(run, payload, adjacency, skipped, get_kwargs, propagate)
+        if visited is None:
+            return {"payload": payload, "success": False}
         return {"payload": payload, "success": end in visited}
 
 
 class WorkflowForm(ServiceForm):
     form_type = HiddenField(default="workflow")
     close_connection = BooleanField(default=False)
+    max_parallel_services = IntegerField(
+        "Maximum number of services run in parallel", default=1
+    )
     run_method = SelectField(
         "Run Method",
         choices=(
@@ -281,3 +369,10 @@ class WorkflowEdge(AbstractBase):
             f"Edge from '{self.source.name}' to '{self.destination}'"
             f" in {self.workflow.name}"
         )
+
+
+@event.listens_for(WorkflowEdge, "after_insert")
+@event.listens_for(WorkflowEdge, "after_update")
+@event.listens_for(WorkflowEdge, "after_delete")
+def invalidate_adjacency(mapper, connection, edge):
+    Workflow.adjacency_cache.pop(edge.workflow_id, None)
@@ -16,6 +16,8 @@ import {
   notify,
   openPanel,
   showTypePanel,
+  subscribe,
+  unsubscribe,
 } from "./base.js";
 import { initTable, tables } from "./table.js";
 import {
@@ -27,6 +29,8 @@ import {
   workflow,
 } from "./workflow.js";
 
+let logStreams = {};
+
 function openServicePanel() {
   showTypePanel($("#service-type").val());
 }
@@ -216,10 +220,7 @@ function displayLogs(service, runtime, change) {
     $(`#service-logs-${service.id}`).data("CodeMirrorInstance", editor);
     editor.setSize("100%", "100%");
   }
-  $(`#runtimes-logs-${service.id}`).on("change", function() {
-    refreshLogs(service, this.value, editor);
-  });
-  refreshLogs(service, runtime, editor, true);
+  streamLogs(service, runtime, editor);
 }
 
 function displayResultsTree(service, runtime) {
@@ -303,24 +304,51 @@ function displayResultsTable(service, runtime) {
   initTable("result", service, runtime || currentRuntime, service.id);
 }
 
-function refreshLogs(service, runtime, editor, first, wasRefreshed) {
-  if (!$(`#service-logs-${service.id}`).length) return;
-  call({
-    url: `/get_service_logs/${service.id}/${runtime}`,
-    callback: function(result) {
-      editor.setValue(result.logs);
-      editor.setCursor(editor.lineCount(), 0);
-      if (first || result.refresh) {
-        setTimeout(
-          () => refreshLogs(service, runtime, editor, false, result.refresh),
-          1000
-        );
-      } else if (wasRefreshed) {
-        $(`#logs-${service.id}`).remove();
-        showRuntimePanel("results", service, runtime);
-      }
+function appendLogs(editor, logs, line) {
+  if (!line) {
+    editor.setValue(logs);
+  } else if (logs) {
+    editor.replaceRange(`\n${logs}`, { line: editor.lastLine() });
+  }
+  editor.setCursor(editor.lineCount(), 0);
+}
+
+function streamLogs(service, runtime, editor, line = 0, live = false) {
+  const key = `logs-${service.id}`;
+  const stream = (logStreams[service.id] = {});
+  const endStream = function() {
+    if (logStreams[service.id] !== stream) return;
+    if (!$(`#service-logs-${service.id}`).length) return;
+    call({
+      url: `/get_service_logs/${service.id}/${runtime}/${line}`,
+      callback: function(result) {
+        appendLogs(editor, result.logs, line);
+        if (result.refresh) {
+          const args = [service, runtime, editor, result.line, live];
+          setTimeout(() => streamLogs(...args), 1000);
+        } else if (live) {
+          $(`#logs-${service.id}`).remove();
+          showRuntimePanel("results", service, runtime);
+        }
+      },
+    });
+  };
+  subscribe(
+    key,
+    {
+      logs: function(data) {
+        if (!$(`#service-logs-${service.id}`).length) return unsubscribe(key);
+        appendLogs(editor, data.logs, line);
+        line = data.line;
+        live = true;
+      },
+      state: () => (live = true),
+      end: endStream,
+      error: endStream,
     },
-  });
+    runtime,
+    line
+  );
 }
 
 export const normalRun = function(id) {
@@ -447,6 +475,21 @@ function schedulerAction(action) {
   });
 }
 
+function displaySchedulerStatus() {
+  call({
+    url: "/get_scheduler_status",
+    callback: function(status) {
+      notify(
+        `Scheduler: ${status.running} run(s) in progress, ${status.queued} waiting
+        for a slot (${status.deferred} deferred, ${status.dropped} dropped and
+        ${status.missed} missed since startup).`,
+        "success",
+        10
+      );
+    },
+  });
+}
+
 Object.assign(action, {
   Edit: (service) => showTypePanel(service.type, service.id),
   Duplicate: (service) => showTypePanel(service.type, service.id, "duplicate"),
@@ -469,6 +512,7 @@ configureNamespace("automation", [
   compare,
   copyClipboard,
   displayCalendar,
+  displaySchedulerStatus,
   exportService,
   field,
   normalRun,
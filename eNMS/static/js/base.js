@@ -20,6 +20,8 @@ import { creationMode, processWorkflowData, workflow } from "./workflow.js";
 export let editors = {};
 export let userIsActive = true;
 let topZ = 1000;
+let runEvents;
+let runSubscriptions = {};
 
 export function detectUserInactivity() {
   let timer;
@@ -122,6 +124,75 @@ export const call = function({ url, data, form, callback }) {
   $.ajax(params);
 };
 
+function openRunEvents() {
+  if (runEvents) runEvents.close();
+  runEvents = null;
+  let runs = false;
+  let lines = {};
+  Object.values(runSubscriptions).forEach(({ runtime, line }) => {
+    if (!runtime) return (runs = true);
+    const current = runtime in lines ? lines[runtime] : -1;
+    lines[runtime] = current < 0 || (line >= 0 && line < current) ? line : current;
+  });
+  let parameters = Object.entries(lines).map(
+    ([runtime, line]) => `runtime=${encodeURIComponent(runtime)}&line=${line}`
+  );
+  if (runs) parameters.push("runs=1");
+  if (!parameters.length) return;
+  runEvents = new EventSource(`/run_events?${parameters.join("&")}`);
+  ["runs", "logs", "state", "end"].forEach((event) => {
+    runEvents.addEventListener(event, function(message) {
+      dispatchRunEvent(event, JSON.parse(message.data));
+    });
+  });
+  runEvents.onerror = function() {
+    const subscriptions = Object.values(runSubscriptions);
+    runEvents.close();
+    runEvents = null;
+    runSubscriptions = {};
+    subscriptions.forEach(({ handlers }) => {
+      if (handlers.error) handlers.error();
+    });
+  };
+}
+
+function dispatchRunEvent(event, data) {
+  for (const [key, subscription] of Object.entries(runSubscriptions)) {
+    if (runSubscriptions[key] !== subscription) continue;
+    if (event == "runs" ? subscription.runtime : subscription.runtime != data.runtime) {
+      continue;
+    }
+    const handler = subscription.handlers[event];
+    if (event == "logs") {
+      if (subscription.line < 0 || data.line <= subscription.line) continue;
+      const logs = data.logs.slice(Math.max(subscription.line - data.start, 0));
+      subscription.line = data.line;
+      if (handler) handler({ logs: logs.join("\n"), line: data.line });
+    } else if (event == "end") {
+      delete runSubscriptions[key];
+      if (handler) handler(data);
+    } else if (handler) {
+      handler(event == "state" ? data.delta : data);
+    }
+  }
+  if (runEvents && !Object.keys(runSubscriptions).length) openRunEvents();
+}
+
+export function subscribe(key, handlers, runtime, line) {
+  runSubscriptions[key] = {
+    handlers: handlers,
+    runtime: runtime,
+    line: handlers.logs ? line || 0 : -1,
+  };
+  openRunEvents();
+}
+
+export function unsubscribe(key) {
+  if (!(key in runSubscriptions)) return;
+  delete runSubscriptions[key];
+  openRunEvents();
+}
+
 export function serializeForm(form) {
   const data = JSON.parse(JSON.stringify($(form).serializeArray()));
   let result = {};
@@ -774,6 +845,8 @@ function fullScreen() {
   }
 }
 
+document.addEventListener("jspanelclosed", (event) => unsubscribe(event.detail));
+
 configureNamespace("base", [
   call,
   clearAlerts,
@@ -9,6 +9,8 @@ import {
   createTooltips,
   notify,
   serializeForm,
+  subscribe,
+  unsubscribe,
   userIsActive,
 } from "./base.js";
 import { loadServiceTypes } from "./automation.js";
@@ -26,6 +28,8 @@ export function initTable(type, instance, runtime, id) {
     column.name = column.data;
   });
   const tableId = `${type}${id ? `-${id}` : ""}`;
+  let keysets = {};
+  let query;
   // eslint-disable-next-line new-cap
   tables[type] = $(`#table-${tableId}`).DataTable({
     serverSide: true,
@@ -117,9 +121,16 @@ export function initTable(type, instance, runtime, id) {
         if (runtime) {
           d.runtime = $(`#runtimes-${instance.id}`).val() || runtime;
         }
+        const newQuery = JSON.stringify({ ...d, draw: null, start: null });
+        if (newQuery != query) {
+          keysets = {};
+          query = newQuery;
+        }
+        if (keysets[d.start]) d.keyset = keysets[d.start];
         return JSON.stringify(d);
       },
       dataSrc: function(result) {
+        if (result.keyset) keysets[result.keyset.start] = result.keyset.value;
         return result.data.map(
           (instance) => new models[type]({ properties: instance, tableId: tableId })
         );
@@ -130,7 +141,7 @@ export function initTable(type, instance, runtime, id) {
     tables[type].order([0, "desc"]).draw();
   }
   if (["run", "service", "task", "workflow"].includes(type)) {
-    refreshTablePeriodically(type, 3000, true);
+    refreshTableOnRunEvents(type);
   }
 }
 
@@ -149,6 +160,22 @@ function refreshTablePeriodically(tableType, interval, first) {
   setTimeout(() => refreshTablePeriodically(tableType, interval), interval);
 }
 
+function refreshTableOnRunEvents(tableType) {
+  let lastRuns;
+  subscribe(`table-${tableType}`, {
+    runs: function(runs) {
+      if (!$(`#table-${tableType}`).length) return unsubscribe(`table-${tableType}`);
+      if (tableType != "run") {
+        runs = Object.entries(runs).map(([runtime, run]) => [runtime, run.status]);
+      }
+      const changed = lastRuns !== undefined && JSON.stringify(runs) != lastRuns;
+      lastRuns = JSON.stringify(runs);
+      if (changed && userIsActive) refreshTable(tableType, false);
+    },
+    error: () => refreshTablePeriodically(tableType, 3000, true),
+  });
+}
+
 class Base {
   constructor({ properties, tableId, derivedProperties }) {
     this.tableId = tableId;
@@ -252,6 +279,7 @@ class Base {
           >
             <option value="inclusion">Inclusion</option>
             <option value="equality">Equality</option>
+            <option value="prefix">Prefix</option>
             <option value="regex">Regular Expression</option>
           </select>
         </div>`,
@@ -797,6 +825,11 @@ models.task = class Task extends Base {
       <button type="button" class="btn btn-danger"
       onclick="eNMS.automation.schedulerAction('pause')" data-tooltip="Pause"
         ><span class="glyphicon glyphicon-pause"></span
+      ></button>
+      <button type="button" class="btn btn-info"
+      onclick="eNMS.automation.displaySchedulerStatus()"
+      data-tooltip="Scheduler Status"
+        ><span class="glyphicon glyphicon-stats"></span
       ></button>`,
     ];
   }
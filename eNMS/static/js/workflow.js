@@ -20,6 +20,8 @@ import {
   notify,
   openPanel,
   showTypePanel,
+  subscribe,
+  unsubscribe,
   userIsActive,
 } from "./base.js";
 import { tables } from "./table.js";
@@ -29,6 +31,8 @@ export let arrowPointer = page == "workflow_builder" ? -1 : 0;
 export let currentPath = localStorage.getItem("path");
 export let workflow = JSON.parse(localStorage.getItem("workflow"));
 export let currentRuntime;
+let stateStream;
+let endedRuntimes = new Set();
 
 vis.Network.prototype.zoom = function(scale) {
   const animationOptions = {
@@ -90,6 +94,7 @@ let currLabel;
 let triggerMenu;
 
 export function displayWorkflow(workflowData) {
+  if (!workflow || workflow.id != workflowData.service.id) closeStateStream();
   workflow = workflowData.service;
   nodes = new vis.DataSet(workflow.services.map(serviceToNode));
   edges = new vis.DataSet(workflow.edges.map(edgeToEdge));
@@ -774,12 +779,24 @@ export function getServiceState(id, first) {
   call({
     url: `/get_service_state/${id}`,
     callback: function(result) {
-      if (first || result.state.status == "Running") {
+      const running = result.state && result.state.status == "Running";
+      if (first || running) {
         colorService(id, "#89CFF0");
         if (result.service && result.service.type === "workflow") {
           localStorage.setItem("path", id);
           localStorage.setItem("workflow", JSON.stringify(result.service));
         }
+      }
+      if (running) {
+        subscribe(
+          `service-state-${id}`,
+          {
+            end: () => colorService(id, "#D2E5FF"),
+            error: () => setTimeout(() => getServiceState(id), 300),
+          },
+          result.runtime
+        );
+      } else if (first) {
         setTimeout(() => getServiceState(id), 300);
       } else {
         colorService(id, "#D2E5FF");
@@ -855,10 +872,50 @@ function resetDisplay() {
   });
 }
 
+function mergeState(state, delta) {
+  for (const [key, value] of Object.entries(delta)) {
+    if (value && typeof value == "object" && state[key]) {
+      mergeState(state[key], value);
+    } else {
+      state[key] = value;
+    }
+  }
+}
+
+function closeStateStream() {
+  if (stateStream) unsubscribe("workflow-state");
+  stateStream = null;
+}
+
+function streamWorkflowState(result) {
+  closeStateStream();
+  stateStream = result.runtime;
+  subscribe(
+    "workflow-state",
+    {
+      state: function(delta) {
+        const sameRuntime = currentRuntime == result.runtime;
+        if (!workflow || workflow.id != result.service.id || !sameRuntime) {
+          return closeStateStream();
+        }
+        mergeState(result.state, delta);
+        displayWorkflowState(result);
+      },
+      end: function() {
+        stateStream = null;
+        endedRuntimes.add(result.runtime);
+        getWorkflowState();
+      },
+      error: () => (stateStream = null),
+    },
+    result.runtime
+  );
+}
+
 function getWorkflowState(periodic, notification) {
   const runtime = $("#current-runtime").val();
   const url = runtime ? `/${runtime}` : "";
-  if (userIsActive && workflow && workflow.id) {
+  if (userIsActive && workflow && workflow.id && !(periodic && stateStream)) {
     call({
       url: `/get_service_state/${currentPath}${url}`,
       callback: function(result) {
@@ -869,6 +926,10 @@ function getWorkflowState(periodic, notification) {
         } else {
           displayWorkflowState(result);
         }
+        const running = result.state && result.state.status == "Running";
+        if (running && !stateStream && !endedRuntimes.has(result.runtime)) {
+          streamWorkflowState(result);
+        }
       },
     });
   }
@@ -1,5 +1,6 @@
 bind = "0.0.0.0:5000"
 workers = 1
+threads = 200
 accesslog = "-"
 loglevel = "debug"
 capture_output = True
@@ -0,0 +1,50 @@
+from asyncio import sleep as async_sleep
+from sqlalchemy import ForeignKey, Integer
+from sqlalchemy.orm import configure_mappers
+from time import perf_counter, sleep
+
+from eNMS import app
+from eNMS.database import Base, engine, Session
+from eNMS.database.dialect import Column
+from eNMS.database.functions import factory, fetch_all
+from eNMS.models.automation import Service
+
+LATENCY, DEVICES, CONCURRENCY = 0.5, 2000, 500
+
+
+class LatencyService(Service):
+
+    __tablename__ = "latency_service"
+    id = Column(Integer, ForeignKey("service.id"), primary_key=True)
+    __mapper_args__ = {"polymorphic_identity": "latency_service"}
+
+    def job(self, run, payload, device):
+        sleep(LATENCY)
+        return {"success": True}
+
+    async def async_job(self, run, payload, device):
+        await async_sleep(LATENCY)
+        return {"success": True}
+
+
+configure_mappers()
+Base.metadata.create_all(bind=engine)
+for index in range(DEVICES):
+    factory("device", name=f"latency-{index}", dont_update_pools=True)
+Session.commit()
+devices = [device.id for device in fetch_all("device") if "latency" in device.name]
+service = factory(
+    "latency_service",
+    name="latency_benchmark",
+    scoped_name="latency_benchmark",
+    multiprocessing=True,
+    max_processes=CONCURRENCY,
+)
+Session.commit()
+
+for method in ("thread", "asyncio"):
+    service.multiprocessing_method = method
+    Session.commit()
+    start = perf_counter()
+    results = app.run(service.id, devices=devices)
+    print(f"{method}: {perf_counter() - start:.2f}s (success: {results['success']})")
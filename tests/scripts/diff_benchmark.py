@@ -0,0 +1,80 @@
+from difflib import SequenceMatcher
+from random import Random
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+
+from eNMS.controller.diff import get_opcodes
+
+INTERFACES = 6_000
+
+
+def router_configuration(interfaces, seed=0):
+    random = Random(seed)
+    lines = ["hostname core-router-1", "!", "service timestamps log datetime msec", "!"]
+    for index in range(interfaces):
+        vlan = random.randint(2, 4000)
+        lines.extend(
+            (
+                f"interface GigabitEthernet{index // 48}/0/{index % 48}",
+                f" description uplink-{random.randint(1, 999)}",
+                " switchport mode trunk" if index % 3 else " no switchport",
+                f" switchport trunk allowed vlan {vlan},{vlan + 1}",
+                " no shutdown",
+                "!",
+            )
+        )
+    for index in range(interfaces // 4):
+        lines.append(f"ip route 10.{index // 256}.{index % 256}.0 255.255.255.0 Null0")
+    lines.extend(("!", "line vty 0 4", " transport input ssh", "end"))
+    return lines
+
+
+def modified(lines, changes, seed=1):
+    random, lines = Random(seed), list(lines)
+    for index in range(changes):
+        position = random.randrange(len(lines))
+        if index % 3 == 0:
+            lines[position] = f" description changed-{index}"
+        elif index % 3 == 1:
+            lines.insert(position, "!")
+        else:
+            del lines[position]
+    return lines
+
+
+def equal_lines(opcodes):
+    return sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal")
+
+
+def repeated_lines(count, seed):
+    random = Random(seed)
+    return [f" vlan {random.randrange(100)}" for _ in range(count)]
+
+
+configuration = router_configuration(INTERFACES)
+half = len(configuration) // 2
+cases = {
+    "identical": (configuration, list(configuration)),
+    "50 changes": (configuration, modified(configuration, 50)),
+    "500 changes": (configuration, modified(configuration, 500)),
+    "moved block": (configuration, configuration[half:] + configuration[:half]),
+    "no common lines": (["!", " shutdown"] * 1500, ["end", " no shutdown"] * 1500),
+    "shuffled repeated lines": (repeated_lines(3000, 0), repeated_lines(3000, 1)),
+}
+print(f"{len(configuration)} lines")
+for name, (first, second) in cases.items():
+    for engine, function in (
+        ("SequenceMatcher", lambda: SequenceMatcher(None, first, second).get_opcodes()),
+        ("get_opcodes", lambda: get_opcodes(first, second)),
+    ):
+        start_time = perf_counter()
+        opcodes = function()
+        duration = perf_counter() - start_time
+        start()
+        function()
+        peak = get_traced_memory()[1]
+        stop()
+        print(
+            f"{name} - {engine}: {duration:.2f}s, {peak / 2 ** 20:.1f} MB peak, "
+            f"{len(opcodes)} opcodes, {equal_lines(opcodes)} equal lines"
+        )
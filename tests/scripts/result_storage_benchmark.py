@@ -0,0 +1,83 @@
+from pathlib import Path
+from sqlalchemy import (
+    Boolean,
+    Column,
+    create_engine,
+    func,
+    Integer,
+    JSON,
+    MetaData,
+    select,
+    Table,
+)
+from time import perf_counter
+
+from eNMS.database.dialect import CompressedJSONType, CustomPickleType
+
+RESULTS = 100_000
+
+
+def synthetic_result(index):
+    configuration = "\n".join(
+        f"interface GigabitEthernet0/{port}\n description uplink-{index}-{port}"
+        for port in range(20)
+    )
+    return {
+        "success": bool(index % 3),
+        "runtime": f"2020-01-01 00:00:{index % 60:02}.000000",
+        "duration": "0:00:02",
+        "result": configuration,
+        "match": f"uplink-{index}",
+        "negative_logic": False,
+        "logs": [],
+    }
+
+
+results = [synthetic_result(index) for index in range(RESULTS)]
+storage_types = (
+    ("pickle", CustomPickleType),
+    ("json", JSON(none_as_null=True)),
+    ("compressed", CompressedJSONType),
+)
+
+for name, storage_type in storage_types:
+    path = Path.cwd() / f"storage_benchmark_{name}.db"
+    engine = create_engine(f"sqlite:///{path}")
+    table = Table(
+        "result",
+        MetaData(bind=engine),
+        Column("id", Integer, primary_key=True),
+        Column("success", Boolean),
+        Column("result", storage_type),
+    )
+    table.create()
+    start = perf_counter()
+    engine.execute(
+        table.insert(),
+        [{"success": result["success"], "result": result} for result in results],
+    )
+    write_time = perf_counter() - start
+    start = perf_counter()
+    engine.execute(select([table.c.result])).fetchall()
+    read_time = perf_counter() - start
+    start = perf_counter()
+    if name == "json":
+        query = select([table.c.id]).where(
+            func.json_extract(table.c.result, "$.match") == "uplink-42"
+        )
+        matches = [row.id for row in engine.execute(query)]
+    else:
+        matches = [
+            row.id
+            for row in engine.execute(select([table.c.id, table.c.result]))
+            if row.result["match"] == "uplink-42"
+        ]
+    filter_time = perf_counter() - start
+    size = path.stat().st_size / 1_000_000
+    engine.dispose()
+    path.unlink()
+    print(
+        f"{name:<10} size: {size:7.1f} MB | write: {write_time:5.2f}s | "
+        f"read all: {read_time:5.2f}s | filter on key: {filter_time:5.2f}s "
+        f"({len(matches)} match)"
+    )
@@ -0,0 +1,45 @@
+from re import compile
+from time import perf_counter
+
+from eNMS.database import Session
+from eNMS.database.functions import factory
+from eNMS.models.inventory import Device
+
+DEVICES = 10_000
+TEMPLATE = """hostname {{device.name}}
+interface Loopback0
+ description managed by {{workflow or "eNMS"}}
+ ip address {{device.ip_address}} 255.255.255.255
+snmp-server location {{device.location or "unknown"}}
+logging host {{settings["syslog"]["address"]}}
+"""
+
+
+def legacy_sub(run, input, variables):
+    regex = compile("{{(.*?)}}")
+
+    def replace(match):
+        return str(run.eval(match.group()[2:-2], **variables)[0])
+
+    return regex.sub(replace, input)
+
+
+service = factory(
+    "swiss_army_knife_service",
+    name="substitution_benchmark",
+    scoped_name="substitution_benchmark",
+)
+Session.commit()
+run = factory("run", service=service.id)
+Session.flush()
+devices = [
+    Device(name=f"router-{index}", ip_address=f"10.{index // 256}.{index % 256}.1")
+    for index in range(DEVICES)
+]
+
+for name, function in (("legacy", legacy_sub), ("compiled", type(run).sub)):
+    start = perf_counter()
+    for device in devices:
+        function(run, TEMPLATE, {"device": device, "payload": {}})
+    print(f"{name}: {perf_counter() - start:.2f}s for {DEVICES} devices")
+Session.rollback()
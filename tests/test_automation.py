@@ -0,0 +1,384 @@
+from apscheduler.schedulers.background import BackgroundScheduler
+from json import loads
+from pytest import raises
+from pytz import utc
+from threading import Event, Lock, Thread, Timer
+from time import sleep, time
+
+from eNMS import app
+from eNMS.controller.connections import ConnectionPool
+from eNMS.controller.logs import RunLog
+from eNMS.controller.scheduler import BudgetExecutor
+from eNMS.database import Session
+from eNMS.database.functions import factory, fetch, fetch_all
+from eNMS.models import automation
+
+
+def test_result_buffer(user_client, monkeypatch):
+    monkeypatch.setitem(app.settings["automation"], "result_batch_size", 3)
+    monkeypatch.setitem(app.settings["automation"], "result_batch_interval", 3600)
+    service = factory("python_snippet_service", name="buffer", scoped_name="buffer")
+    Session.commit()
+    run = factory("run", service=service.id, runtime="buffer", creator="admin")
+    Session.commit()
+
+    def buffer_result(index):
+        app.buffer_result(
+            run.id,
+            {
+                "run_id": run.id,
+                "service_id": service.id,
+                "parent_runtime": "buffer",
+                "runtime": str(index),
+                "success": True,
+                "result": {"index": index},
+            },
+        )
+
+    for index in range(2):
+        buffer_result(index)
+    assert not fetch_all("result", parent_runtime="buffer")
+    buffer_result(2)
+    assert len(fetch_all("result", parent_runtime="buffer")) == 3
+    buffer_result(3)
+    assert len(fetch_all("result", parent_runtime="buffer")) == 3
+    app.flush_results(run.id)
+    results = fetch_all("result", parent_runtime="buffer")
+    assert sorted(result.result["index"] for result in results) == [0, 1, 2, 3]
+
+
+def test_result_flush_failure(user_client, monkeypatch):
+    flush_results = app.flush_results
+
+    def failing_flush(run_id):
+        monkeypatch.setattr(app, "flush_results", flush_results)
+        raise Exception("Database unavailable")
+
+    service = factory(
+        "python_snippet_service",
+        name="flush",
+        scoped_name="flush",
+        source_code="save_result(success=True, result='done')",
+    )
+    Session.commit()
+    monkeypatch.setattr(app, "flush_results", failing_flush)
+    results = app.run(service.id, runtime="flush", creator="admin")
+    assert results["success"] and "Failed to store results" in str(results["logs"])
+    run = fetch("run", runtime="flush")
+    assert run.status == "Completed" and run.service.status == "Idle"
+    assert not app.run_store.get_state("flush")
+
+
+def test_run_log_offsets():
+    log = RunLog()
+    log.size = 4
+    lines = [f"{index} - interface état" for index in range(10)]
+    log.extend(lines[:7])
+    for line in lines[7:]:
+        log.append(line)
+    assert len(log) == 10 and len(log.offsets) == 9
+    assert log.read(0, 10) == (lines, 10)
+    assert log.read(3, 4) == (lines[3:7], 7)
+    assert log.read(6, 4) == (lines[6:], 10)
+    assert log.read(10) == ([], 10)
+    assert log.dump() == lines
+
+
+def test_budget_executor_deferral():
+    executor = BudgetExecutor(
+        max_workers=4, max_runs=2, max_deferred_runs=1, max_runs_per_service=1
+    )
+    scheduler = BackgroundScheduler(executors={"default": executor}, timezone=utc)
+    scheduler.start()
+    started, finish = [], Event()
+
+    def run(service, job):
+        started.append(job)
+        finish.wait(5)
+
+    try:
+        for service, job in (("a", "a1"), ("a", "a2"), ("b", "b1"), ("b", "b2")):
+            scheduler.add_job(run, args=[service, job], id=job)
+            sleep(0.2)
+        assert sorted(started) == ["a1", "b1"]
+        assert executor.status == {
+            "running": 2,
+            "queued": 1,
+            "deferred": 1,
+            "dropped": 1,
+            "missed": 0,
+        }
+        finish.set()
+        sleep(0.5)
+        assert sorted(started) == ["a1", "a2", "b1"]
+        assert executor.status["running"] == executor.status["queued"] == 0
+    finally:
+        finish.set()
+        scheduler.shutdown()
+
+
+class Connection:
+    def __init__(self, **kwargs):
+        self.closed, self.commands = False, []
+
+    def find_prompt(self):
+        return "router#"
+
+    def enable(self):
+        pass
+
+    def config_mode(self):
+        pass
+
+    def check_config_mode(self):
+        return False
+
+    def send_config_set(self, commands, **kwargs):
+        self.commands.extend(commands)
+
+    def disconnect(self):
+        self.closed = True
+
+
+def connection_pool(**settings):
+    return ConnectionPool(
+        **{
+            "max_size": 10,
+            "max_per_device": 2,
+            "idle_timeout": 3600,
+            "probe_interval": 60,
+            "reaper_interval": 3600,
+            "reaper_threads": 2,
+            "checkout_timeout": 5,
+            **settings,
+        }
+    )
+
+
+def test_connection_pool_checkout():
+    pool, connection, results = connection_pool(), Connection(), []
+    assert pool.get("netmiko", "runtime", "router") is None
+    pool.add("netmiko", "runtime", "router", connection)
+
+    def checkout():
+        results.append(pool.get("netmiko", "runtime", "router"))
+        pool.release("runtime", "router")
+
+    thread = Thread(target=checkout)
+    thread.start()
+    sleep(0.2)
+    assert thread.is_alive() and not results
+    pool.release("runtime", "router")
+    thread.join(5)
+    assert results == [connection]
+    assert pool.status["reused"] == 1 and pool.status["in_use"] == 0
+    assert pool.close("netmiko", "runtime", "router") == "closed"
+    assert connection.closed and not pool.status["size"]
+
+
+def test_connection_pool_eviction():
+    pool, connections = connection_pool(checkout_timeout=0.2), {}
+    for runtime in ("runtime1", "runtime2"):
+        assert pool.get("netmiko", runtime, "router") is None
+        connections[runtime] = Connection()
+        pool.add("netmiko", runtime, "router", connections[runtime])
+    with raises(Exception, match="limit reached"):
+        pool.get("netmiko", "runtime3", "router")
+    pool.release("runtime1", "router")
+    assert pool.get("netmiko", "runtime3", "router") is None
+    errors = []
+
+    def checkout():
+        try:
+            pool.get("netmiko", "runtime2", "router")
+        except Exception as exc:
+            errors.append(str(exc))
+
+    thread = Thread(target=checkout)
+    thread.start()
+    thread.join(5)
+    assert errors == ["Connection to 'router' is still in use"]
+    pool.executor.shutdown(wait=True)
+    assert connections["runtime1"].closed and not connections["runtime2"].closed
+    assert pool.status["evicted"] == 1
+
+
+def test_connection_release_after_job_failure(user_client, monkeypatch):
+    monkeypatch.setattr(app.connections_cache, "checkout_timeout", 1)
+    connections, lock = [], Lock()
+
+    def connect(**kwargs):
+        with lock:
+            connections.append(Connection(**kwargs) if len(connections) > 1 else None)
+        if not connections[-1]:
+            raise Exception("Connection refused")
+        return connections[-1]
+
+    monkeypatch.setattr(automation, "ConnectHandler", connect)
+    devices = [
+        factory("device", name=f"pool-router{index}", ip_address=f"192.0.2.{index}")
+        for index in range(1, 3)
+    ]
+    services = [
+        factory(
+            "netmiko_configuration_service",
+            name=f"pool-{index}",
+            scoped_name=f"pool-{index}",
+            content="hostname router",
+            multiprocessing=not index,
+        )
+        for index in range(2)
+    ]
+    Session.commit()
+    workflow = factory(
+        "workflow",
+        name="pool",
+        scoped_name="pool",
+        run_method="per_service_with_workflow_targets",
+        devices=[device.id for device in devices],
+        services=[service.id for service in services],
+    )
+    Session.commit()
+    edges = (
+        (fetch("service", scoped_name="Start"), services[0], "success"),
+        (services[0], services[1], "failure"),
+        (services[1], fetch("service", scoped_name="End"), "success"),
+    )
+    for source, destination, subtype in edges:
+        factory(
+            "workflow_edge",
+            workflow=workflow.id,
+            source=source.id,
+            destination=destination.id,
+            subtype=subtype,
+        )
+    Session.commit()
+    results = app.run(workflow.id, runtime="pool", creator="admin")
+    assert results["success"] and len(connections) == 4
+    for connection in connections[2:]:
+        assert connection.commands == ["hostname router"] and connection.closed
+    assert not app.connections_cache.status["in_use"]
+
+
+def create_workflow(name, edges, delays, max_parallel_services=2, **kwargs):
+    services = {}
+    for service, delay in delays.items():
+        services[service] = factory(
+            "python_snippet_service",
+            name=f"{name}-{service}",
+            scoped_name=f"{name}-{service}",
+            run_method="once",
+            source_code=(
+                "from time import sleep, time\n"
+                f"sleep({delay})\n"
+                f"set_var('{service}', time())\n"
+                f"set_var('{service}_runs', (get_var('{service}_runs', "
+                "allow_none=True) or 0) + 1)\n"
+                f"save_result(success=True, result='{service}')"
+            ),
+            **kwargs.get(service, {}),
+        )
+    Session.commit()
+    workflow = factory(
+        "workflow",
+        name=name,
+        scoped_name=name,
+        run_method="per_service_with_service_targets",
+        max_parallel_services=max_parallel_services,
+        services=[service.id for service in services.values()],
+    )
+    services["Start"] = fetch("service", scoped_name="Start")
+    services["End"] = fetch("service", scoped_name="End")
+    Session.commit()
+    for source, destination, subtype in edges:
+        factory(
+            "workflow_edge",
+            workflow=workflow.id,
+            source=services[source].id,
+            destination=services[destination].id,
+            subtype=subtype,
+        )
+    Session.commit()
+    return workflow, services
+
+
+def test_workflow_parallel_branches(user_client):
+    edges = [
+        ("Start", "a", "success"),
+        ("Start", "b", "success"),
+        ("a", "c", "success"),
+        ("b", "c", "prerequisite"),
+        ("c", "End", "success"),
+    ]
+    workflow, _ = create_workflow("parallel", edges, {"a": 0, "b": 1, "c": 0})
+    start = time()
+    results = app.run(workflow.id, runtime="parallel", creator="admin")
+    variables = results["payload"]["variables"]
+    assert results["success"] and time() - start < 1.8
+    assert variables["a"] < variables["b"] < variables["c"]
+    assert variables["c_runs"] == 1
+    assert app.payload_locks.get("parallel") is None
+
+
+def test_workflow_maximum_runs(user_client):
+    edges = [("Start", "a", "success"), ("a", "a", "success"), ("a", "End", "success")]
+    for max_parallel_services in (1, 2):
+        name = f"maximum-runs-{max_parallel_services}"
+        workflow, _ = create_workflow(
+            name, edges, {"a": 0}, max_parallel_services, a={"maximum_runs": 3}
+        )
+        results = app.run(workflow.id, runtime=name, creator="admin")
+        assert results["success"] and results["payload"]["variables"]["a_runs"] == 3
+
+
+def test_workflow_stop(user_client):
+    edges = [("Start", "a", "success"), ("a", "b", "success"), ("b", "End", "success")]
+    workflow, _ = create_workflow("stop", edges, {"a": 1, "b": 0})
+    Timer(0.5, app.stop_workflow, args=["stop"]).start()
+    results = app.run(workflow.id, runtime="stop", creator="admin")
+    assert not results["success"] and "b" not in results["payload"]["variables"]
+    assert fetch("run", runtime="stop").status == "Aborted"
+
+
+def test_workflow_restart(user_client):
+    edges = [
+        ("Start", "a", "success"),
+        ("a", "b", "success"),
+        ("b", "c", "success"),
+        ("c", "End", "success"),
+    ]
+    workflow, services = create_workflow("restart", edges, {"a": 0, "b": 0, "c": 0})
+    assert app.run(workflow.id, runtime="restart", creator="admin")["success"]
+    results = app.run(
+        workflow.id,
+        runtime="restarted",
+        creator="admin",
+        restart_runtime="restart",
+        restart_path=f"{workflow.id}>{services['b'].id}",
+    )
+    variables = results["payload"]["variables"]
+    assert results["success"]
+    assert (variables["a_runs"], variables["b_runs"], variables["c_runs"]) == (1, 2, 2)
+
+
+def test_run_events(user_client, monkeypatch):
+    monkeypatch.setitem(app.settings["automation"]["run_events"], "interval", 0.05)
+    edges = [("Start", "a", "success"), ("a", "b", "success"), ("b", "End", "success")]
+    workflow, _ = create_workflow("events", edges, {"a": 0.5, "b": 0})
+    run = Thread(target=app.run, args=(workflow.id,), kwargs={"runtime": "events"})
+    run.start()
+    while app.run_store.get_state("events") is None:
+        sleep(0.01)
+    events = {}
+    for message in app.run_events(True, {"events": 0, "other": -1}):
+        event, data = (line.split(": ", 1)[1] for line in message.split("\n")[:2])
+        events.setdefault(event, []).append(loads(data))
+        if event == "end" and loads(data)["runtime"] == "events":
+            break
+    run.join()
+    assert events["end"][0] == {"runtime": "other", "line": -1}
+    assert all(data["runtime"] == "events" for data in events["state"])
+    assert events["state"][0]["delta"]["status"] == "Running"
+    assert events["logs"][0]["start"] == 0 and events["logs"][0]["logs"]
+    assert events["runs"][0]["events"]["status"] == "Running"
+    assert "total" in events["runs"][0]["events"]["progress"]
@@ -1,7 +1,21 @@
+from collections import Counter
+from random import Random
 from werkzeug.datastructures import ImmutableMultiDict
 
 from eNMS import app
-from eNMS.database.functions import delete_all, fetch, fetch_all
+from eNMS.controller.diff import get_opcodes
+from eNMS.controller.history import apply_delta, make_delta
+from eNMS.database import Session
+from eNMS.database.functions import (
+    delete_all,
+    factory,
+    fetch,
+    fetch_all,
+    fetch_cache,
+    fetch_cache_counters,
+    fetch_cache_index,
+)
+from eNMS.models import models
 from eNMS.setup import properties
 
 from tests.conftest import check_pages
@@ -143,3 +157,193 @@ def test_pool_management(user_client):
     user_client.post(f"/delete_instance/pool/{p1.id}")
     user_client.post(f"/delete_instance/pool/{p2.id}")
     assert len(fetch_all("pool")) == 7
+
+
+def table_page(client, start, keyset=None):
+    response = client.post(
+        "/table_filtering/device",
+        json={
+            "draw": 1,
+            "columns": [{"data": "location"}, {"data": "name"}],
+            "order": [{"column": 0, "dir": "asc"}],
+            "start": start,
+            "length": 5,
+            "form": {},
+            **({"keyset": keyset} if keyset else {}),
+        },
+    ).json
+    return [device["name"] for device in response["data"]], response.get("keyset")
+
+
+def test_keyset_pagination(user_client):
+    create_from_file(user_client, "europe.xls")
+    offset_names, keyset_names, keyset = [], [], None
+    for start in range(0, 35, 5):
+        offset_names.extend(table_page(user_client, start)[0])
+        names, keyset = table_page(user_client, start, keyset and keyset["value"])
+        assert keyset["start"] == start + 5
+        keyset_names.extend(names)
+    assert len(offset_names) == len(set(offset_names)) == 33
+    assert keyset_names == offset_names
+
+
+def configuration(changes):
+    lines = [f"interface Ethernet{index}\n description uplink\n" for index in range(40)]
+    for index in changes:
+        lines[index] = f"interface Ethernet{index}\n description changed\n"
+    return "".join(lines)
+
+
+def test_data_version_deltas(user_client):
+    device = factory("device", name="history")
+    Session.commit()
+    configurations = [configuration(range(index)) for index in range(5)]
+    for content in configurations:
+        assert app.update_device_data(device, "configuration", content)
+        Session.commit()
+    assert not app.update_device_data(device, "configuration", configurations[-1])
+    versions = app.get_data_versions(device.id, "configuration")
+    assert [version["snapshot"] for version in versions] == [False] * 4 + [True]
+    for version, content in enumerate(configurations, 1):
+        assert app.get_data_version(device.id, "configuration", version) == content
+    old, new = configurations[0], configurations[-1] + "end\n"
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def search_devices(**form):
+    constraints = app.build_filtering_constraints("device", form=form)
+    query = Session.query(models["device"]).filter(*constraints)
+    return sorted(device.name for device in query if device.name.startswith("search"))
+
+
+def test_configuration_search_index(user_client, monkeypatch):
+    assert app.search_index
+    for index in range(5):
+        factory(
+            "device",
+            name=f"search{index}",
+            configuration=configuration(range(index)),
+            operational_data=f"uptime {index} days",
+        )
+    Session.commit()
+    fetch("device", name="search4").configuration = "hostname EDGE_50%"
+    Session.delete(fetch("device", name="search3"))
+    Session.commit()
+    searches = [
+        {"configuration": "changed"},
+        {"configuration": "CHANGED"},
+        {"configuration": "Ethernet1\n description changed"},
+        {"configuration": "e_50%"},
+        {"configuration": "et"},
+        {"configuration": "changed", "configuration_filter": "regex"},
+        {"operational_data": "2 days"},
+    ]
+    indexed = [search_devices(**form) for form in searches]
+    monkeypatch.setattr(app, "search_index", False)
+    assert indexed == [search_devices(**form) for form in searches]
+    assert indexed[:4] == [["search1", "search2"]] * 2 + [["search2"], ["search4"]]
+    assert indexed[6] == ["search2"]
+
+
+def test_fetch_cache(user_client, monkeypatch):
+    monkeypatch.setitem(app.settings["database"], "fetch_cache_size", 2)
+    devices = [factory("device", name=f"cache{index}") for index in range(3)]
+    Session.commit()
+    fetch_cache.clear()
+    fetch_cache_index.clear()
+    start = Counter(fetch_cache_counters)
+
+    def lookups(*names):
+        for name in names:
+            assert fetch("device", name=name).name == name
+        return fetch_cache_counters - start
+
+    assert lookups("cache0", "cache0") == {"miss": 1, "hit": 1}
+    assert lookups("cache1", "cache0", "cache2") == {"miss": 3, "hit": 2}
+    assert list(fetch_cache) == [
+        ("device", "name", "cache0"),
+        ("device", "name", "cache2"),
+    ]
+    assert lookups("cache0", "cache1") == {"miss": 4, "hit": 3}
+    devices[0].name = "renamed"
+    Session.commit()
+    assert ("device", "name", "cache0") not in fetch_cache
+    assert not fetch("device", name="cache0", allow_none=True)
+    assert fetch("device", name="renamed") == devices[0]
+
+
+def check_opcodes(old, new, **kwargs):
+    opcodes, result, i, j = get_opcodes(old, new, **kwargs), [], 0, 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == "equal":
+            assert old[i1:i2] == new[j1:j2]
+        result.extend(new[j1:j2])
+        i, j = i2, j2
+    assert (i, j) == (len(old), len(new)) and result == new
+    return opcodes
+
+
+def test_diff_opcodes():
+    first = [f"line {index}" for index in range(200)] + ["!"] * 20
+    second = first[100:] + first[:100]
+    second[10:12] = ["changed", "line 0"]
+    del second[150]
+    for old, new in ((first, second), (first, first), ([], first), (first, [])):
+        check_opcodes(old, new)
+    assert get_opcodes(first, first) == [["equal", 0, 220, 0, 220]]
+    assert get_opcodes(["a", "b", "c"], ["a", "x", "c"]) == [
+        ["equal", 0, 1, 0, 1],
+        ["replace", 1, 2, 1, 2],
+        ["equal", 2, 3, 2, 3],
+    ]
+
+
+def test_diff_without_unique_lines():
+    random = Random(0)
+    assert get_opcodes(["!", "end"] * 1500, ["#", "exit"] * 1500) == [
+        ["replace", 0, 3000, 0, 3000]
+    ]
+    first = [f"vlan {random.randrange(100)}" for _ in range(3000)]
+    second = [f"vlan {random.randrange(100)}" for _ in range(3000)]
+    for max_cost in (0, 20, 500):
+        opcodes = check_opcodes(first, second, max_cost=max_cost)
+        assert any(opcode[0] == "equal" for opcode in opcodes)
+
+
+def test_pool_computation_equivalence(user_client, monkeypatch):
+    create_from_file(user_client, "europe.xls")
+    for name, vendor in (("Paris", "Cisco"), ("50%_off", None), ("a_b", "cisco")):
+        factory("device", name=name, vendor=vendor)
+    Session.commit()
+    pools = [
+        {"device_name": "paris"},
+        {"device_name": "Paris", "device_name_match": "equality"},
+        {"device_name": "%", "link_name": "_"},
+        {"device_name": "a_b", "device_vendor": "Cisco", "operator": "any"},
+        {"device_vendor": "None", "device_vendor_match": "equality"},
+        {"device_name": "^[A-Z]", "device_name_match": "regex"},
+        {"device_location": "france|spain", "device_location_match": "regex"},
+        {"link_name": "link[1|2].", "link_name_match": "regex"},
+    ]
+    for index, pool in enumerate(pools):
+        pool = {"form_type": "pool", "name": f"pool{index}", "operator": "all", **pool}
+        user_client.post("/update/pool", data=create_pool(pool))
+
+    def members():
+        return {
+            pool.name: (
+                sorted(device.name for device in pool.devices),
+                sorted(link.name for link in pool.links),
+            )
+            for pool in fetch_all("pool")
+        }
+
+    python_members = members()
+    monkeypatch.setitem(app.settings["database"], "pool_computation", "sql")
+    for pool in fetch_all("pool"):
+        pool.compute_pool()
+    Session.commit()
+    assert members() == python_members
+    assert python_members["pool1"][0] == ["Paris"]
+    assert python_members["pool2"][0] == ["50%_off"]